@@ -0,0 +1,124 @@
+import json
+import random
+from typing import Dict, List, Any
+
+# Fixed seed so every run measures exactly the same inputs
+SEED = 1337
+
+INTENT_MESSAGES = [
+    "build a rps game",
+    "how to make a rps game?",
+    "can you help me make a rps game?",
+    "integrate it",
+    "add it to the bot",
+    "what is your name?",
+    "hello jarvis",
+    "please refactor the todo plugin to use async file access",
+    "rewrite the weather module from scratch",
+    "explain how pyrogram filters work",
+    "thanks, that worked",
+    "make a reminder command that pings me every hour",
+    "i need help with my quiz plugin",
+    "update the greeting handler to support stickers",
+    "tell me a joke",
+]
+
+SMALL_MODULE = '''from pyrogram import filters
+
+
+def register_handlers(app, bot):
+    @bot.on_message(filters.command("rps") & filters.private)
+    async def rps_command(client, message):
+        try:
+            choice = message.command[1] if len(message.command) > 1 else "rock"
+            await message.reply(f"You picked {choice}, I picked paper.")
+        except Exception as e:
+            await message.reply(f"Error: {e}")
+'''
+
+MEDIUM_MODULE_HEADER = '''import json
+import os
+import random
+from pyrogram import filters
+
+DATA_FILE = "db/game.json"
+
+
+def _load():
+    if os.path.exists(DATA_FILE):
+        with open(DATA_FILE) as f:
+            return json.load(f)
+    return {}
+
+
+def _save(data):
+    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
+    with open(DATA_FILE, "w") as f:
+        json.dump(data, f)
+
+'''
+
+MEDIUM_HANDLER_TEMPLATE = '''
+    @bot.on_message(filters.command("{name}") & filters.private)
+    async def {name}_command(client, message):
+        try:
+            data = _load()
+            score = data.get(str(message.from_user.id), 0) + random.randint(1, {n})
+            data[str(message.from_user.id)] = score
+            _save(data)
+            await message.reply(f"{name}: your score is {{score}}")
+        except Exception as e:
+            await message.reply(f"Error: {{e}}")
+'''
+
+
+def medium_module(handlers: int = 12) -> str:
+    """Build a multi-handler plugin of roughly 200 lines"""
+    body = "".join(
+        MEDIUM_HANDLER_TEMPLATE.format(name=f"game{i}", n=i + 2) for i in range(handlers)
+    )
+    return MEDIUM_MODULE_HEADER + "\ndef register_handlers(app, bot):" + body
+
+
+def make_tasks(count: int) -> List[Dict[str, Any]]:
+    """Generate task records shaped like the ones written by SandboxManager"""
+    rng = random.Random(SEED)
+    statuses = ["sandboxed", "integrated", "cleaned"]
+    base_ts = 1_720_000_000
+    tasks = []
+    for i in range(count):
+        name = f"feature_{i % 500}"
+        tasks.append({
+            "id": base_ts + i,
+            "user_id": rng.choice([123456789, 987654321, 555000111, 42]),
+            "timestamp": base_ts + i + 0.25,
+            "status": rng.choice(statuses),
+            "files": [f"sandbox/{name}/handler.py", f"sandbox/{name}/utils.py"],
+            "errors": [],
+        })
+    return tasks
+
+
+def make_chat_history(turns: int) -> List[Dict[str, str]]:
+    """Generate an alternating user/assistant conversation"""
+    rng = random.Random(SEED)
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": rng.choice(INTENT_MESSAGES)})
+        history.append({"role": "assistant", "content": f"Answer number {i}. " * 8})
+    return history
+
+
+def make_llm_responses() -> Dict[str, str]:
+    """LLM code responses in the shapes we actually receive from the model"""
+    payload = json.dumps({
+        "files": {
+            "sandbox/rps/handler.py": SMALL_MODULE,
+            "sandbox/game/handler.py": medium_module(),
+        }
+    })
+    return {
+        "clean": payload,
+        "fenced": f"```json\n{payload}\n```",
+        "chatty": f"Sure! Here is the module you asked for:\n{payload}\nLet me know if you need changes.",
+    }
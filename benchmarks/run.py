@@ -0,0 +1,351 @@
+"""
+Offline benchmark suite for JARVIS hot paths.
+
+Usage (from the repository root):
+    python -m benchmarks.run                       # run and compare with baseline
+    python -m benchmarks.run --save-baseline       # record a new baseline
+    python -m benchmarks.run --sizes 10000,1000000 # task store sizes to measure
+    python -m benchmarks.run --only memory         # run a subset by name prefix
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(REPO_ROOT, "benchmarks")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results", "latest.json")
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import fixtures  # noqa: E402
+
+
+class BenchmarkSkipped(Exception):
+    """Raised by a benchmark setup when its target cannot run here"""
+
+
+class Benchmark:
+    def __init__(self, name: str, setup: Callable[[], Callable[[], Any]],
+                 number: int = 100, repeat: int = 5):
+        self.name = name
+        self.setup = setup
+        self.number = number
+        self.repeat = repeat
+
+    def run(self) -> Dict[str, Any]:
+        """Time the callable returned by setup; report per-call seconds"""
+        try:
+            func = self.setup()
+        except BenchmarkSkipped as e:
+            return {"skipped": str(e)}
+
+        func()  # warm-up
+        samples = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            for _ in range(self.number):
+                func()
+            samples.append((time.perf_counter() - start) / self.number)
+
+        return {
+            "median": statistics.median(samples),
+            "min": min(samples),
+            "number": self.number,
+            "repeat": self.repeat,
+        }
+
+
+def _write_json(path: str, data: Any):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+# ---------------------------------------------------------------- benchmarks
+
+def bench_intent_classifier() -> List[Benchmark]:
+    def setup():
+        from core.intent_classifier import intent_classifier
+        messages = fixtures.INTENT_MESSAGES
+
+        def run():
+            for text in messages:
+                intent_classifier.classify_intent(text, 42, is_dev=True)
+        return run
+
+    return [Benchmark("intent.classify_intent[15 msgs]", setup, number=200)]
+
+
+def bench_memory_manager(sizes: List[int]) -> List[Benchmark]:
+    benches = []
+    for size in sizes:
+        # Large stores are expensive per call, keep total runtime bounded
+        number = max(1, 20_000 // size)
+        repeat = 5 if size <= 100_000 else 2
+
+        def seed_store(size=size):
+            from memory import memory_manager
+            memory_manager.save_tasks(fixtures.make_tasks(size))
+            return memory_manager
+
+        def setup_log(size=size):
+            memory_manager = seed_store(size)
+            task = fixtures.make_tasks(1)[0]
+            ids = itertools.count(-1, -1)  # Task IDs must be unique
+            return lambda: memory_manager.log_task(dict(task, id=next(ids)))
+
+        def setup_get_last(size=size):
+            memory_manager = seed_store(size)
+            last_id = fixtures.make_tasks(size)[-1]["id"]
+            return lambda: memory_manager.get_task_by_id(last_id)
+
+        def setup_get_missing(size=size):
+            memory_manager = seed_store(size)
+            return lambda: memory_manager.get_task_by_id(-404)
+
+        def setup_query(size=size):
+            memory_manager = seed_store(size)
+            return lambda: memory_manager.query_tasks(user_id=42, status="sandboxed", limit=10, offset=10)
+
+        benches.append(Benchmark(f"memory.log_task[{size}]", setup_log, number, repeat))
+        benches.append(Benchmark(f"memory.query_tasks.page[{size}]", setup_query, number, repeat))
+        benches.append(Benchmark(f"memory.get_task_by_id.last[{size}]", setup_get_last, number, repeat))
+        benches.append(Benchmark(f"memory.get_task_by_id.missing[{size}]", setup_get_missing, number, repeat))
+    return benches
+
+
+def bench_conversation_manager() -> List[Benchmark]:
+    benches = []
+    for turns in (10, 100, 1000):
+        def setup(turns=turns):
+            from memory.conversation_manager import get_chat_memory, save_chat_memory
+            history = fixtures.make_chat_history(turns)
+
+            def run():
+                save_chat_memory(42, history)
+                get_chat_memory(42)
+            return run
+
+        benches.append(Benchmark(f"conversation.round_trip[{turns * 2} msgs]", setup,
+                                 number=max(5, 2000 // turns)))
+    return benches
+
+
+def bench_regression_checker() -> List[Benchmark]:
+    modules = {
+        "small": fixtures.SMALL_MODULE,
+        "medium": fixtures.medium_module(),
+    }
+    benches = []
+    for label, source in modules.items():
+        def setup(label=label, source=source):
+            from modules.regression_checker import regression_checker
+            path = os.path.join("sandbox", f"bench_{label}", "handler.py")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(source)
+            return lambda: regression_checker.comprehensive_check(path)
+
+        benches.append(Benchmark(f"checker.comprehensive_check[{label}]", setup, number=3, repeat=3))
+    return benches
+
+
+def bench_response_cleaning() -> List[Benchmark]:
+    responses = fixtures.make_llm_responses()
+    benches = []
+
+    def setup_clean_code_blocks():
+        from modules.file_manager import clean_code_blocks
+        fenced = f"```python\n{fixtures.medium_module()}\n```"
+        return lambda: clean_code_blocks(fenced)
+
+    benches.append(Benchmark("clean.clean_code_blocks", setup_clean_code_blocks, number=2000))
+
+    for label, response in responses.items():
+        def setup(response=response):
+            from modules.file_manager import clean_json_response
+
+            def run():
+                json.loads(clean_json_response(response))
+            return run
+
+        def setup_extract(response=response):
+            from modules.json_stream import StreamingFilesExtractor
+
+            def run():
+                extractor = StreamingFilesExtractor()
+                for i in range(0, len(response), 256):
+                    extractor.feed(response[i:i + 256])
+                extractor.close()
+            return run
+
+        benches.append(Benchmark(f"clean._clean_json_response[{label}]", setup, number=500))
+        benches.append(Benchmark(f"clean.streaming_extract[{label}]", setup_extract, number=200))
+    return benches
+
+
+def bench_pipeline() -> List[Benchmark]:
+    def setup():
+        from jarvis_engine import jarvis_engine
+        from core.sandbox_manager import sandbox_manager
+        from memory import memory_manager
+
+        # Start from an empty task store, not the one seeded by memory benchmarks
+        memory_manager.save_tasks([])
+
+        def run():
+            result = jarvis_engine.generate_code("build a rps game", task_type="CREATE")
+            sandbox_manager.create_sandbox_files(result, 42)
+        return run
+
+    return [Benchmark("pipeline.create[recorded]", setup, number=5, repeat=3)]
+
+
+def collect(sizes: List[int]) -> List[Benchmark]:
+    return (
+        bench_intent_classifier()
+        + bench_memory_manager(sizes)
+        + bench_conversation_manager()
+        + bench_regression_checker()
+        + bench_response_cleaning()
+        + bench_pipeline()
+    )
+
+
+# ---------------------------------------------------------------- comparison
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return the names of benchmarks slower than baseline by more than threshold"""
+    regressions = []
+    base_benches = baseline.get("benchmarks", {})
+
+    print(f"\n{'benchmark':<48} {'median':>12} {'baseline':>12} {'change':>9}")
+    for name, current in results["benchmarks"].items():
+        base = base_benches.get(name, {})
+        if "skipped" in current:
+            print(f"{name:<48} {'skipped':>12}   {current['skipped']}")
+            continue
+        if "median" not in base:
+            print(f"{name:<48} {_fmt(current['median']):>12} {'-':>12} {'new':>9}")
+            continue
+
+        ratio = current["median"] / base["median"] if base["median"] else 1.0
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  improved"
+        print(f"{name:<48} {_fmt(current['median']):>12} {_fmt(base['median']):>12} "
+              f"{(ratio - 1) * 100:>+8.1f}%{flag}")
+
+    # Tools added to the checker after the baseline was recorded did not run then
+    base_tools = baseline.get("environment", {}).get("tools") or {}
+    tools = results["environment"].get("tools") or {}
+    if any(tools.get(tool) != available for tool, available in base_tools.items()) or not base_tools:
+        print("\n⚠️ Lint tool availability differs from baseline; checker timings are not comparable.")
+
+    return regressions
+
+
+def _fmt(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}us"
+
+
+def _use_recorded_backend(settings_path: str):
+    """Point the scratch settings at the offline recorded LLM backend"""
+    with open(settings_path) as f:
+        settings = json.load(f)
+    llm = settings.setdefault("llm", {})
+    llm["backend"] = "recorded"
+    llm["recorded"] = {"path": os.path.join(BENCH_DIR, "recordings.json"), "latency_ms": 0}
+    _write_json(settings_path, settings)
+
+
+def _environment() -> Dict[str, Any]:
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    try:
+        from modules.regression_checker import regression_checker
+        env["tools"] = regression_checker.tools_available
+    except Exception:
+        env["tools"] = None
+    return env
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run JARVIS hot-path benchmarks")
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="Comma-separated task store sizes (default: 10000,100000)")
+    parser.add_argument("--only", default=None, help="Only run benchmarks whose name starts with this")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="Relative slowdown that counts as a regression (default: 0.20)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store results as the new baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    # Run inside a scratch directory so the modules' relative logs/, sandbox/
+    # paths never touch the real bot data.
+    workdir = tempfile.mkdtemp(prefix="jarvis-bench-")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    shutil.copytree(os.path.join(REPO_ROOT, "config"), "config")
+    _use_recorded_backend(os.path.join("config", "settings.json"))
+
+    try:
+        results = {
+            "timestamp": datetime.now().isoformat(),
+            "environment": _environment(),
+            "benchmarks": {},
+        }
+        for bench in collect(sizes):
+            if args.only and not bench.name.startswith(args.only):
+                continue
+            print(f"running {bench.name} ...", flush=True)
+            results["benchmarks"][bench.name] = bench.run()
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    _write_json(RESULTS_FILE, results)
+
+    if args.save_baseline:
+        _write_json(BASELINE_FILE, results)
+        print(f"\n✅ Baseline saved to {os.path.relpath(BASELINE_FILE, REPO_ROOT)}")
+        return 0
+
+    if not os.path.exists(BASELINE_FILE):
+        print("\nNo baseline found; run with --save-baseline to create one.")
+        return 0
+
+    with open(BASELINE_FILE) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
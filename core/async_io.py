@@ -0,0 +1,165 @@
+import os
+import atexit
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Union
+from core.role_manager import settings
+
+logger = logging.getLogger(__name__)
+
+# fsync policies:
+#   always - fsync the file and its directory before the write counts as done
+#   never  - leave flushing to the OS (data survives a process crash, not a power cut)
+FSYNC_POLICIES = ("always", "never")
+
+_config = settings.get("io", {})
+_executor = ThreadPoolExecutor(max_workers=_config.get("workers", 4), thread_name_prefix="jarvis-io")
+
+
+async def run_io(fn: Callable, *args, **kwargs) -> Any:
+    """Run blocking disk work on the I/O pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+def write_file(path: str, data: Union[str, bytes], fsync: bool = False):
+    """Atomically replace path with data (write to a temp file, then rename)"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(tmp_path, mode, **({} if mode == "wb" else {"encoding": "utf-8"})) as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if fsync:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class WriteStore:
+    """
+    Writes for one store (tasks, conversations, ...) with its own policy.
+
+    write() hands the data to the I/O pool and returns a Future, so it can
+    be called from coroutines (await asyncio.wrap_future) and from worker
+    threads alike. With a coalesce window, writes to the same path within
+    the window collapse into one: only the latest data reaches disk and
+    every caller's Future resolves when it does. read() sees data that is
+    still pending, so readers never observe an older version.
+    """
+
+    def __init__(self, name: str, fsync: str = "never", coalesce_ms: int = 0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy for {name}: {fsync}")
+        self.name = name
+        self.fsync = fsync == "always"
+        self.coalesce = coalesce_ms / 1000
+        self._pending: Dict[str, list] = {}
+        self._path_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def write(self, path: str, data: Union[str, bytes]) -> Future:
+        with self._lock:
+            entry = self._pending.get(path)
+            if entry is not None:
+                entry[0] = data
+                return entry[1]
+            future = Future()
+            self._pending[path] = [data, future]
+
+        if self.coalesce:
+            timer = threading.Timer(self.coalesce, self._schedule, (path,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._schedule(path)
+        return future
+
+    def write_sync(self, path: str, data: Union[str, bytes]):
+        """Write now on the calling thread, superseding any pending write"""
+        with self._path_lock(path):
+            with self._lock:
+                entry = self._pending.pop(path, None)
+            write_file(path, data, self.fsync)
+        if entry is not None:
+            entry[1].set_result(None)
+
+    def read(self, path: str) -> Optional[Union[str, bytes]]:
+        """Pending data for path, or the file's content, or None if neither exists"""
+        with self._lock:
+            entry = self._pending.get(path)
+            if entry is not None:
+                return entry[0]
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def flush(self):
+        """Write everything pending now"""
+        with self._lock:
+            paths = list(self._pending)
+        for path in paths:
+            self._flush(path)
+
+    def _path_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(path, threading.Lock())
+
+    def _schedule(self, path: str):
+        try:
+            _executor.submit(self._flush, path)
+        except RuntimeError:  # Pool already shut down at exit
+            self._flush(path)
+
+    def _flush(self, path: str):
+        # The entry stays pending (and readable) until its data is on disk
+        while True:
+            with self._path_lock(path):
+                with self._lock:
+                    entry = self._pending.get(path)
+                    if entry is None:
+                        return
+                    data = entry[0]
+                try:
+                    write_file(path, data, self.fsync)
+                except Exception as e:
+                    logger.error(f"{self.name} store: writing {path} failed: {e}")
+                    with self._lock:
+                        self._pending.pop(path, None)
+                    entry[1].set_exception(e)
+                    return
+                with self._lock:
+                    # Newer data that arrived while writing shares this Future
+                    if entry[0] is data:
+                        self._pending.pop(path)
+                        break
+        entry[1].set_result(None)
+
+
+_stores: Dict[str, WriteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(name: str) -> WriteStore:
+    """The shared store for name, configured from settings["io"]["stores"]"""
+    with _stores_lock:
+        if name not in _stores:
+            options = _config.get("stores", {}).get(name, {})
+            _stores[name] = WriteStore(name, options.get("fsync", "never"), options.get("coalesce_ms", 0))
+        return _stores[name]
+
+
+@atexit.register
+def flush_all():
+    for store in list(_stores.values()):
+        store.flush()
@@ -0,0 +1,94 @@
+import time
+import logging
+import threading
+from typing import Dict, List, Any
+from core.role_manager import settings
+from memory.conversation_manager import (
+    chat_lock, get_chat_memory, save_chat_memory, get_chat_summary, save_chat_summary
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationSummarizer:
+    """
+    Compacts long chats into a running summary stored next to them.
+
+    Once a history grows past recent_window + batch messages, everything
+    but the recent window is folded into logs/conversations/<id>.summary.json
+    and dropped from the history, so prompts carry summary + recent window
+    and stay the same size however long the chat lives.
+    """
+
+    def __init__(self):
+        config = settings.get("conversation", {})
+        self.recent_window = config.get("recent_window", 12)
+        self.batch = config.get("summarize_batch", 12)
+        self.summary_budget = config.get("summary_max_tokens", 400)
+        self._running = set()
+        self._guard = threading.Lock()
+
+    def needs_summary(self, memory: List[Dict[str, Any]]) -> bool:
+        return len(memory) >= self.recent_window + self.batch
+
+    def get_context(self, chat_id) -> Dict[str, Any]:
+        """Summary and recent messages to build a prompt from"""
+        return {
+            "summary": get_chat_summary(chat_id).get("summary", ""),
+            "recent": get_chat_memory(chat_id)[-self.recent_window:],
+        }
+
+    def schedule(self, loop, chat_id):
+        """Summarize in a worker thread unless one is already running for this chat"""
+        with self._guard:
+            if chat_id in self._running:
+                return None
+            self._running.add(chat_id)
+        return loop.run_in_executor(None, self._run, chat_id)
+
+    def _run(self, chat_id):
+        try:
+            self.summarize(chat_id)
+        except Exception as e:
+            logger.error(f"Conversation summarization failed for {chat_id}: {e}")
+        finally:
+            with self._guard:
+                self._running.discard(chat_id)
+
+    def summarize(self, chat_id) -> bool:
+        """Fold everything but the recent window into the running summary"""
+        from jarvis_engine import jarvis_engine
+
+        memory = get_chat_memory(chat_id)
+        if not self.needs_summary(memory):
+            return False
+
+        older = memory[:-self.recent_window]
+        previous = get_chat_summary(chat_id)
+
+        # The LLM call runs without the lock; new messages only ever append
+        summary_text = jarvis_engine.summarize_conversation(
+            previous.get("summary", ""), older, max_tokens=self.summary_budget
+        )
+        if not summary_text:
+            return False
+
+        with chat_lock(chat_id):
+            current = get_chat_memory(chat_id)
+            if current[:len(older)] != older:
+                # History was cleared or rewritten meanwhile; drop this summary
+                return False
+
+            save_chat_summary(chat_id, {
+                "summary": summary_text,
+                "summarized_messages": previous.get("summarized_messages", 0) + len(older),
+                "updated": time.time(),
+            })
+            save_chat_memory(chat_id, current[len(older):])
+
+        logger.info(f"Summarized {len(older)} messages for chat {chat_id}")
+        return True
+
+
+# Global instance
+conversation_summarizer = ConversationSummarizer()
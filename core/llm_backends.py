@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+import weakref
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Any, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+
+class LLMBackend(ABC):
+    """Interface every LLM provider implements"""
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        """Generate a complete response and return its text"""
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        """Yield response text chunks; backends without streaming yield once"""
+        yield self.generate(prompt, model)
+
+
+class SlotStream:
+    """
+    Streamed response holding one of a backend's connection slots.
+
+    The slot is taken on the first read and given back exactly once: when
+    the response is exhausted or fails, when close() is called, or when a
+    caller drops the stream without finishing it.
+    """
+
+    def __init__(self, slots: threading.BoundedSemaphore, open_stream: Callable[[], Iterable[str]]):
+        self._slots = slots
+        self._open_stream = open_stream
+        self._chunks: Optional[Iterator[str]] = None
+        self._release: Optional[weakref.finalize] = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self._chunks is None:
+            self._slots.acquire()
+            # Must not reference self, so the finalizer also runs once the stream is garbage
+            self._release = weakref.finalize(self, self._slots.release)
+            try:
+                self._chunks = iter(self._open_stream())
+            except BaseException:
+                self.close()
+                raise
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._release is not None:
+            self._release()  # a finalizer runs at most once
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+        self._chunks = iter(())
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini through google.generativeai.
+
+    The SDK is configured once, on first use, and its generative service
+    client is created right away. Every GenerativeModel (one per model
+    name, created lazily) then uses that client, so all calls share its
+    gRPC channel or, for the REST transport, its pooled requests session;
+    keep-alive on those connections is left to the SDK. In-flight
+    requests, streams included, are capped at max_connections.
+    """
+
+    name = "gemini"
+
+    def __init__(self, config: Dict[str, Any]):
+        self.default_model = config.get("model", DEFAULT_MODEL)
+        self.transport = config.get("transport", "grpc")
+        self.max_connections = config.get("max_connections", 8)
+
+        self._genai = None
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+    def _configure(self):
+        """Configure the SDK exactly once per process"""
+        if self._genai is None:
+            import google.generativeai as genai
+
+            from google.generativeai import client as genai_client
+
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"), transport=self.transport)
+            # GenerativeModel picks up this cached default client instead of opening its own
+            genai_client.get_default_generative_client()
+            self._genai = genai
+            logger.info(f"Gemini backend configured (transport={self.transport}, "
+                        f"max_connections={self.max_connections})")
+        return self._genai
+
+    def get_model(self, model_name: Optional[str] = None):
+        """Return the cached model instance, creating it on first use"""
+        model_name = model_name or self.default_model
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if model_name not in self._models:
+                genai = self._configure()
+                self._models[model_name] = genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        llm = self.get_model(model)
+        with self._slots:
+            response = llm.generate_content(prompt)
+        return response.text.strip()
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        llm = self.get_model(model)
+        return SlotStream(self._slots, lambda: (
+            chunk.text for chunk in llm.generate_content(prompt, stream=True)))
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any server speaking the OpenAI chat completions API (OpenAI itself,
+    vLLM, llama.cpp, Ollama, ...). The openai client keeps a pooled
+    keep-alive HTTP connection per process.
+
+    Callers pass Gemini model names; they are translated through the
+    optional "models" map and otherwise replaced by the configured model.
+    """
+
+    name = "openai"
+
+    def __init__(self, config: Dict[str, Any]):
+        self.base_url = config.get("base_url")
+        self.api_key = os.getenv(config.get("api_key_env", "OPENAI_API_KEY"), "not-needed")
+        self.default_model = config.get("model", "gpt-4o-mini")
+        self.model_map = config.get("models", {})
+        self.timeout = config.get("timeout", 60)
+        self.max_connections = config.get("max_connections", 8)
+
+        self._client = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+
+                    self._client = OpenAI(base_url=self.base_url, api_key=self.api_key, timeout=self.timeout)
+                    logger.info(f"OpenAI-compatible backend configured (base_url={self.base_url or 'default'})")
+        return self._client
+
+    def _resolve_model(self, model: Optional[str]) -> str:
+        return self.model_map.get(model, self.default_model)
+
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        client = self._get_client()
+        with self._slots:
+            response = client.chat.completions.create(
+                model=self._resolve_model(model),
+                messages=[{"role": "user", "content": prompt}],
+            )
+        return (response.choices[0].message.content or "").strip()
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        client = self._get_client()
+
+        def open_stream():
+            response = client.chat.completions.create(
+                model=self._resolve_model(model),
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+            )
+            return (chunk.choices[0].delta.content for chunk in response
+                    if chunk.choices and chunk.choices[0].delta.content)
+
+        return SlotStream(self._slots, open_stream)
+
+
+CANNED_PLUGIN = '''from pyrogram import filters
+
+
+def register_handlers(app, bot):
+    @bot.on_message(filters.command("{command}") & filters.private)
+    async def {command}_command(client, message):
+        try:
+            await message.reply("{command} is working.")
+        except Exception as e:
+            await message.reply(f"Error: {{e}}")
+'''
+
+
+class RecordedBackend(LLMBackend):
+    """
+    Offline, deterministic stand-in for load tests and benchmarks.
+
+    Responses are looked up by prompt hash in a JSON recordings file. On
+    a miss, a canned response is returned: a small valid plugin for code
+    prompts, a fixed sentence otherwise. With "record_from" set, misses
+    are forwarded to that backend once and saved for later runs.
+    """
+
+    name = "recorded"
+
+    def __init__(self, config: Dict[str, Any]):
+        self.path = config.get("path", "logs/llm_recordings.json")
+        self.latency = config.get("latency_ms", 0) / 1000
+        self.chunk_size = config.get("chunk_size", 256)
+        self.source: Optional[LLMBackend] = None
+
+        self._lock = threading.Lock()
+        self._recordings: Dict[str, str] = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self._recordings = json.load(f)
+
+    @staticmethod
+    def prompt_key(prompt: str, model: Optional[str] = None) -> str:
+        return hashlib.sha256(f"{model or ''}\n{prompt}".encode()).hexdigest()
+
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        key = self.prompt_key(prompt, model)
+        response = self._recordings.get(key)
+
+        if response is None and self.source is not None:
+            response = self.source.generate(prompt, model)
+            self._save(key, response)
+        elif response is None:
+            response = self._canned(prompt, key)
+
+        if self.latency:
+            time.sleep(self.latency)
+        return response
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        response = self.generate(prompt, model)
+        for i in range(0, len(response), self.chunk_size):
+            yield response[i:i + self.chunk_size]
+
+    def _canned(self, prompt: str, key: str) -> str:
+        if '"files"' in prompt:
+            command = f"canned_{key[:8]}"
+            return json.dumps({
+                "files": {f"sandbox/{command}/handler.py": CANNED_PLUGIN.format(command=command)}
+            })
+        return "This is a recorded JARVIS response."
+
+    def _save(self, key: str, response: str):
+        with self._lock:
+            self._recordings[key] = response
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as f:
+                json.dump(self._recordings, f)
+
+
+SHARED_OPTIONS = ("max_connections", "timeout")
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+    RecordedBackend.name: RecordedBackend,
+}
+
+
+def create_backend(name: str, config: Dict[str, Any]) -> LLMBackend:
+    """
+    Build a backend from the llm settings section.
+
+    Backend options live in a sub-section named after the backend; the
+    shared top-level options apply to every backend unless overridden.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}'. Available: {', '.join(BACKENDS)}")
+
+    options = {k: config[k] for k in SHARED_OPTIONS if k in config}
+    options.update(config.get(name, {}))
+    backend = BACKENDS[name](options)
+
+    if isinstance(backend, RecordedBackend) and options.get("record_from"):
+        backend.source = create_backend(options["record_from"], config)
+    return backend
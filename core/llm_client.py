@@ -0,0 +1,169 @@
+import re
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Iterator, List, Optional
+from core.role_manager import settings
+from core.llm_backends import LLMBackend, create_backend
+from core.prompt_builder import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_SPACE = re.compile(r"[ \t]+$", re.MULTILINE)
+
+
+def request_key(kind: str, backend: str, model: Optional[str], prompt: str) -> str:
+    """
+    Hash identifying a request; prompts differing only in line endings or
+    trailing whitespace share it. Indentation is kept, as it matters in code.
+    kind ("generate" or "stream") keeps the two call styles apart, since
+    they share different in-flight entries.
+    """
+    normalized = _TRAILING_SPACE.sub("", prompt.replace("\r\n", "\n")).strip("\n")
+    return hashlib.sha256(f"{kind}\0{backend}\0{model or ''}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class _SharedStream:
+    """Chunks of one streamed response, replayed to every caller that joined it"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.cond = threading.Condition()
+
+    def publish(self, chunk: str = None, done: bool = False, error: BaseException = None):
+        with self.cond:
+            if chunk is not None:
+                self.chunks.append(chunk)
+            self.done = self.done or done or error is not None
+            self.error = self.error or error
+            self.cond.notify_all()
+
+    def follow(self) -> Iterator[str]:
+        position = 0
+        while True:
+            with self.cond:
+                while position == len(self.chunks) and not self.done:
+                    self.cond.wait()
+                chunks = self.chunks[position:]
+                done, error = self.done, self.error
+            yield from chunks
+            position += len(chunks)
+            if done and position == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class LLMClient:
+    """
+    Shared entry point for every LLM call site.
+
+    The backend (gemini, openai or recorded) is chosen by the "backend"
+    key of the llm section in config/settings.json and built on first use.
+
+    Identical requests made while one is in flight (a double-sent
+    message, several users greeting at once) are coalesced: the first
+    caller makes the backend call and the others wait for and share its
+    result, or its error. Streams are shared chunk by chunk. Set
+    "coalesce_requests" to false in the llm section to turn this off.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config if config is not None else settings.get("llm", {})
+        self.backend_name = self.config.get("backend", "gemini")
+        self.coalesce = self.config.get("coalesce_requests", True)
+        self._backend: Optional[LLMBackend] = None
+        self._inflight: Dict[str, Any] = {}  # request key -> Future or _SharedStream
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def backend(self) -> LLMBackend:
+        if self._backend is None:
+            self._backend = create_backend(self.backend_name, self.config)
+            logger.info(f"LLM backend: {self.backend_name}")
+        return self._backend
+
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        """Generate a complete response and return its text"""
+        if not self.coalesce:
+            self._log_call(prompt, model)
+            return self.backend.generate(prompt, model)
+
+        key = request_key("generate", self.backend_name, model, prompt)
+        future, leader = self._join(key, Future)
+        if not leader:
+            logger.info(f"LLM call coalesced with an identical in-flight request ({key[:12]})")
+            return future.result()
+
+        try:
+            self._log_call(prompt, model)
+            response = self.backend.generate(prompt, model)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+        future.set_result(response)
+        return response
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        """Yield response text chunks as the model produces them"""
+        if not self.coalesce:
+            self._log_call(prompt, model)
+            return self.backend.stream(prompt, model)
+
+        return self._coalesced_stream(prompt, model)
+
+    def _coalesced_stream(self, prompt: str, model: Optional[str]) -> Iterator[str]:
+        # Joins on first next(), so a stream that is never read never holds up others
+        key = request_key("stream", self.backend_name, model, prompt)
+        shared, leader = self._join(key, _SharedStream)
+        if not leader:
+            logger.info(f"LLM stream coalesced with an identical in-flight request ({key[:12]})")
+            yield from shared.follow()
+            return
+
+        self._log_call(prompt, model)
+        chunks = self.backend.stream(prompt, model)
+        try:
+            for chunk in chunks:
+                shared.publish(chunk)
+                yield chunk
+        except GeneratorExit:
+            # The leading caller stopped reading; followers cannot get the rest
+            shared.publish(error=RuntimeError("Shared LLM stream was abandoned; retry the request"))
+            raise
+        except BaseException as e:
+            shared.publish(error=e)
+            raise
+        else:
+            shared.publish(done=True)
+        finally:
+            self._leave(key)
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()  # frees the backend's connection slot if this stream was abandoned
+
+    def _join(self, key: str, factory):
+        """The in-flight entry for key and whether this caller created it (and must fill it)"""
+        with self._inflight_lock:
+            entry = self._inflight.get(key)
+            if entry is not None:
+                return entry, False
+            entry = self._inflight[key] = factory()
+            return entry, True
+
+    def _leave(self, key: str):
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+
+    def _log_call(self, prompt: str, model: Optional[str]):
+        logger.info(f"LLM call: backend={self.backend_name} model={model or 'default'} "
+                    f"prompt_tokens={count_tokens(prompt)}")
+
+
+# Global instance
+llm_client = LLMClient()
@@ -0,0 +1,301 @@
+import ast
+import re
+import logging
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Iterable
+from core.role_manager import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character estimate
+    tiktoken = None
+
+DEFAULT_BUDGET = 8000
+# tiktoken has no Gemini tokenizer; cl100k is a close enough proxy for budgeting
+ENCODING_NAME = "cl100k_base"
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or estimate ~4 characters per token"""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding(ENCODING_NAME)
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def default_budget() -> int:
+    return settings.get("llm", {}).get("prompt_budget", DEFAULT_BUDGET)
+
+
+@dataclass
+class CodeChunk:
+    """A top-level block of source: a function, a class or module-level code"""
+    name: str
+    start: int  # 1-based, inclusive
+    end: int
+    text: str
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.text)
+
+
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def chunk_code(source: str, max_tokens: Optional[int] = None) -> List[CodeChunk]:
+    """
+    Split source into AST-aware chunks, one per top-level function or
+    class, with the module-level code between them grouped together.
+    Definitions above max_tokens are split into their nested functions
+    (e.g. the handlers inside register_handlers); anything still too
+    large, or unparseable source, is split by lines.
+    """
+    lines = source.splitlines(keepends=True)
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return _split_lines("module", 1, lines, max_tokens)
+
+    chunks = _chunk_body(tree.body, lines, 1, len(lines), "", max_tokens)
+    if max_tokens is None:
+        return chunks
+
+    result = []
+    for chunk in chunks:
+        if chunk.tokens > max_tokens:
+            result.extend(_split_lines(chunk.name, chunk.start, lines[chunk.start - 1:chunk.end], max_tokens))
+        else:
+            result.append(chunk)
+    return result
+
+
+def pack_chunks(chunks: List[CodeChunk], max_tokens: int) -> List[CodeChunk]:
+    """Merge consecutive small chunks so each stays under max_tokens"""
+    packed = []
+    for chunk in chunks:
+        if packed and packed[-1].tokens + chunk.tokens <= max_tokens:
+            last = packed[-1]
+            first_name = last.name.split(" … ")[0]
+            name = first_name if first_name == chunk.name else f"{first_name} … {chunk.name}"
+            packed[-1] = CodeChunk(name, last.start, chunk.end, last.text + chunk.text)
+        else:
+            packed.append(chunk)
+    return packed
+
+
+def _node_start(node: ast.AST) -> int:
+    return min([d.lineno for d in getattr(node, "decorator_list", [])] + [node.lineno])
+
+
+def _chunk_body(body: List[ast.stmt], lines: List[str], first: int, last: int,
+                parent: str, max_tokens: Optional[int]) -> List[CodeChunk]:
+    """Chunk the statements of one block spanning lines first..last"""
+    group_name = f"{parent} (body)" if parent else "module"
+    chunks = []
+    pending_start = first
+
+    def flush(upto: int):
+        if upto >= pending_start:
+            text = "".join(lines[pending_start - 1:upto])
+            if text.strip():
+                chunks.append(CodeChunk(group_name, pending_start, upto, text))
+
+    for node in body:
+        if not isinstance(node, _DEFINITIONS):
+            continue
+
+        start, end = _node_start(node), node.end_lineno
+        flush(start - 1)
+        pending_start = end + 1
+
+        kind = "class" if isinstance(node, ast.ClassDef) else "def"
+        name = f"{parent} > {kind} {node.name}" if parent else f"{kind} {node.name}"
+        chunk = CodeChunk(name, start, end, "".join(lines[start - 1:end]))
+
+        nested = any(isinstance(child, _DEFINITIONS) for child in node.body)
+        if max_tokens is not None and chunk.tokens > max_tokens and nested:
+            chunks.extend(_chunk_body(node.body, lines, start, end, name, max_tokens))
+        else:
+            chunks.append(chunk)
+
+    flush(last)
+    return chunks
+
+
+def _split_lines(name: str, first_line: int, lines: List[str], max_tokens: Optional[int]) -> List[CodeChunk]:
+    """Split lines into consecutive chunks of at most max_tokens"""
+    if max_tokens is None:
+        return [CodeChunk(name, first_line, first_line + len(lines) - 1, "".join(lines))]
+
+    chunks = []
+    start = 0
+    used = 0
+    for i, line in enumerate(lines):
+        cost = count_tokens(line)
+        if used + cost > max_tokens and i > start:
+            chunks.append(CodeChunk(f"{name} (part {len(chunks) + 1})", first_line + start,
+                                    first_line + i - 1, "".join(lines[start:i])))
+            start, used = i, 0
+        used += cost
+    if start < len(lines):
+        part = f"{name} (part {len(chunks) + 1})" if chunks else name
+        chunks.append(CodeChunk(part, first_line + start, first_line + len(lines) - 1, "".join(lines[start:])))
+    return chunks
+
+
+def outline_code(source: str) -> str:
+    """One line per top-level definition, used when the code itself does not fit"""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return ""
+
+    outline = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            outline.append(f"L{node.lineno}: {prefix} {node.name}({ast.unparse(node.args)})")
+        elif isinstance(node, ast.ClassDef):
+            outline.append(f"L{node.lineno}: class {node.name}")
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    outline.append(f"L{item.lineno}:     def {item.name}({ast.unparse(item.args)})")
+    return "\n".join(outline)
+
+
+class PromptBuilder:
+    """
+    Assemble a prompt under a token budget.
+
+    Fixed sections (add) are always included. Flexible sections
+    (add_history, add_code, add_text) share whatever budget is left, in
+    the order they were added: history is trimmed oldest-first, code is
+    reduced to an outline plus the chunks that fit, text is cut.
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget or default_budget()
+        self.tokens = 0
+        self.trimmed = False
+        self._sections = []
+
+    def add(self, text: str) -> "PromptBuilder":
+        self._sections.append(("fixed", text, {}))
+        return self
+
+    def add_history(self, messages: Iterable[Dict[str, str]], title: str = "Recent conversation:") -> "PromptBuilder":
+        self._sections.append(("history", list(messages), {"title": title}))
+        return self
+
+    def add_code(self, code: str, title: str = "Code:", focus_lines: Optional[Iterable[int]] = None) -> "PromptBuilder":
+        self._sections.append(("code", code, {"title": title, "focus_lines": set(focus_lines or [])}))
+        return self
+
+    def add_text(self, text: str, title: str = "", keep: str = "head") -> "PromptBuilder":
+        self._sections.append(("text", text, {"title": title, "keep": keep}))
+        return self
+
+    def build(self) -> str:
+        fixed_tokens = sum(count_tokens(text) for kind, text, _ in self._sections if kind == "fixed")
+        remaining = max(0, self.budget - fixed_tokens)
+
+        parts = []
+        for kind, content, options in self._sections:
+            if kind == "fixed":
+                parts.append(content)
+                continue
+
+            fitted = getattr(self, f"_fit_{kind}")(content, remaining, options)
+            if fitted:
+                remaining -= count_tokens(fitted)
+                parts.append(fitted)
+
+        prompt = "\n".join(parts)
+        self.tokens = count_tokens(prompt)
+        return prompt
+
+    def _fit_history(self, messages: List[Dict[str, str]], budget: int, options: Dict) -> str:
+        title = options["title"]
+        budget -= count_tokens(title)
+        lines = []
+        for msg in reversed(messages):
+            role = "User" if msg.get("role") == "user" else "Assistant"
+            line = f"{role}: {msg.get('content', '')}"
+            cost = count_tokens(line) + 1
+            if cost > budget:
+                self.trimmed = True
+                break
+            lines.append(line)
+            budget -= cost
+
+        if not lines:
+            return ""
+        return title + "\n" + "\n".join(reversed(lines))
+
+    def _fit_code(self, code: str, budget: int, options: Dict) -> str:
+        title = options["title"]
+        full = f"{title}\n{code}"
+        if count_tokens(full) <= budget:
+            return full
+
+        self.trimmed = True
+        outline = outline_code(code)
+        header = f"{title} (too large to include in full; outline and selected parts)\n"
+        if outline:
+            header += f"Outline:\n{outline}\n"
+        budget -= count_tokens(header)
+
+        # Focused chunks first (e.g. lines named in a traceback), then top to bottom
+        chunks = chunk_code(code, max_tokens=max(budget, 1))
+        focus = options["focus_lines"]
+        ordered = sorted(chunks, key=lambda c: not any(c.start <= line <= c.end for line in focus))
+
+        selected = []
+        for chunk in ordered:
+            block = f"# lines {chunk.start}-{chunk.end} ({chunk.name})\n{chunk.text}"
+            cost = count_tokens(block)
+            if cost <= budget:
+                selected.append((chunk.start, block))
+                budget -= cost
+
+        return header + "\n".join(block for _, block in sorted(selected))
+
+    def _fit_text(self, text: str, budget: int, options: Dict) -> str:
+        title = options["title"]
+        full = f"{title}\n{text}" if title else text
+        if count_tokens(full) <= budget:
+            return full
+
+        self.trimmed = True
+        budget -= count_tokens(title) + count_tokens("...[truncated]...")
+        lines = text.splitlines()
+        if options["keep"] == "tail":
+            lines = list(reversed(lines))
+
+        kept = []
+        for line in lines:
+            cost = count_tokens(line) + 1
+            if cost > budget:
+                break
+            kept.append(line)
+            budget -= cost
+
+        if options["keep"] == "tail":
+            body = "...[truncated]...\n" + "\n".join(reversed(kept))
+        else:
+            body = "\n".join(kept) + "\n...[truncated]..."
+        return f"{title}\n{body}" if title else body
+
+
+def traceback_lines(error_traceback: str) -> List[int]:
+    """Line numbers mentioned in a Python traceback"""
+    return [int(n) for n in re.findall(r"line (\d+)", error_traceback)]
@@ -0,0 +1,136 @@
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from core.role_manager import settings, is_owner, is_dev
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    "enabled": True,
+    # Sustained messages per minute and burst size per role; null means unlimited
+    "roles": {
+        "owner": None,
+        "dev": {"per_minute": 30, "burst": 10},
+        "user": {"per_minute": 6, "burst": 3},
+    },
+    "max_concurrent": 8,   # Messages being handled at once, across all users
+    "max_queued": 32,      # Messages allowed to wait for a slot before new ones are turned away
+}
+
+MAX_BUCKETS = 10_000
+
+
+class Overloaded(Exception):
+    """Every handling slot is busy and the wait queue is full"""
+
+
+class RateLimiter:
+    """
+    Admission control in front of intent dispatch.
+
+    Each (role, user) pair has a token bucket refilled at the role's
+    per-minute rate up to its burst size; a message without a token is
+    turned away with a retry hint instead of reaching the LLM. Admitted
+    messages then share max_concurrent handling slots; when all are busy
+    up to max_queued messages wait for one and the rest are rejected.
+    Role limits are read from settings["rate_limit"] on every check, so
+    changing them takes effect immediately.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, Any], list] = {}  # key -> [tokens, last refill, warned]
+        self._rejected = set()  # Invalid role limits already logged
+        config = self._config()
+        self._slots = asyncio.Semaphore(config["max_concurrent"])
+        self._waiting = 0
+
+    def _config(self) -> Dict[str, Any]:
+        configured = settings.get("rate_limit", {})
+        config = dict(DEFAULT_CONFIG, **configured)
+        config["roles"] = dict(DEFAULT_CONFIG["roles"], **configured.get("roles", {}))
+        for role, limit in config["roles"].items():
+            if limit is not None and not (limit.get("per_minute", 0) > 0 and limit.get("burst", 0) >= 1):
+                # A rate of zero would never refill; keep the role's default instead
+                if (role, str(limit)) not in self._rejected:
+                    self._rejected.add((role, str(limit)))
+                    logger.warning(f"Ignoring rate_limit for '{role}': per_minute must be > 0 and burst >= 1")
+                config["roles"][role] = DEFAULT_CONFIG["roles"].get(role, DEFAULT_CONFIG["roles"]["user"])
+        return config
+
+    def role(self, user_id) -> str:
+        if is_owner(user_id):
+            return "owner"
+        return "dev" if is_dev(user_id) else "user"
+
+    def check(self, user_id) -> Tuple[bool, float, bool]:
+        """
+        Take a token for one message from the user.
+
+        Returns (allowed, seconds until the next token, whether to tell
+        the user); only the first rejection of a run is worth a reply.
+        """
+        config = self._config()
+        role = self.role(user_id)
+        limit = config["roles"].get(role)
+        if not config["enabled"] or limit is None:
+            return True, 0.0, False
+
+        rate = limit["per_minute"] / 60
+        burst = limit["burst"]
+        now = time.monotonic()
+        key = (role, user_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            bucket = self._buckets[key] = [burst, now, False]
+
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return True, 0.0, False
+
+        retry_after = (1 - bucket[0]) / rate
+        warn, bucket[2] = not bucket[2], True
+        return False, retry_after, warn
+
+    def _prune(self, now: float):
+        """Forget buckets idle long enough to have refilled completely"""
+        roles = self._config()["roles"]
+        for key, (tokens, last, _) in list(self._buckets.items()):
+            limit = roles.get(key[0])
+            if not limit or now - last >= (limit["burst"] - tokens) / (limit["per_minute"] / 60):
+                del self._buckets[key]
+
+    @asynccontextmanager
+    async def slot(self, on_queued: Optional[Callable[[], Awaitable[Any]]] = None):
+        """
+        Hold one of the shared handling slots.
+
+        Waits if all are busy, calling on_queued first so the user knows;
+        raises Overloaded if too many messages are waiting already.
+        """
+        if self._slots.locked():
+            if self._waiting >= self._config()["max_queued"]:
+                raise Overloaded()
+            self._waiting += 1
+            try:
+                if on_queued is not None:
+                    await on_queued()
+                await self._slots.acquire()
+            finally:
+                self._waiting -= 1
+        else:
+            await self._slots.acquire()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+# Global instance
+rate_limiter = RateLimiter()
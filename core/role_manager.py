@@ -1,8 +1,34 @@
 import json
+import threading
+from memory.wal import WriteAheadLog, write_snapshot
 
-with open("config/settings.json") as f:
+SETTINGS_FILE = "config/settings.json"
+SETTINGS_WAL = "logs/settings.wal"
+SETTINGS_COMPACT_EVERY = 50
+
+with open(SETTINGS_FILE) as f:
     settings = json.load(f)
 
+# Runtime changes are logged first and folded into settings.json periodically
+_settings_wal = WriteAheadLog(SETTINGS_WAL)
+_settings_lock = threading.RLock()
+for _record in _settings_wal.replay():
+    settings[_record["key"]] = _record["value"]
+
+def update_setting(key, value):
+    """Durably change a top-level setting, visible to every module at once"""
+    with _settings_lock:
+        count = _settings_wal.append({"op": "set", "key": key, "value": value})
+        settings[key] = value
+        if count >= SETTINGS_COMPACT_EVERY:
+            compact_settings()
+
+def compact_settings():
+    """Rewrite settings.json with all logged changes and empty the log"""
+    with _settings_lock:
+        write_snapshot(SETTINGS_FILE, json.dumps(settings, indent=2) + "\n")
+        _settings_wal.reset()
+
 BOT = None
 
 def set_bot_instance(bot):
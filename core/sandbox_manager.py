@@ -1,11 +1,18 @@
 import os
 import shutil
 import json
+import re
 import time
+from difflib import unified_diff
 from typing import Dict, List, Any, Optional
-from core.task_manager import backup_file
-from memory.memory_manager import log_task, get_task_by_id
+from core.async_io import get_store
+from core.task_manager import TASK_DIR, backup_file
+from memory.snapshot_store import snapshot_store
+from memory.memory_manager import log_task, get_task_by_id, get_pending_tasks, modify_task, new_task_id, ConflictError
+from modules.file_manager import PatchError, apply_unified_diff, replace_symbol
 from modules.regression_checker import regression_checker
+from modules.plugin_analysis import format_blocking
+from modules.check_cache import CheckCache
 from error_handler import capture_exception
 
 class SandboxManager:
@@ -15,56 +22,72 @@ class SandboxManager:
         os.makedirs(self.sandbox_dir, exist_ok=True)
         os.makedirs(self.plugins_dir, exist_ok=True)
     
-    def create_sandbox_files(self, task_data: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+    def create_sandbox_files(self, task_data: Dict[str, Any], user_id: int,
+                             base_task_id: int = None) -> Dict[str, Any]:
         """
         Create files in sandbox based on AI-generated code
         
         Args:
             task_data: Dictionary containing files and their content
             user_id: User ID who initiated the task
+            base_task_id: Task this one edits, if any
             
         Returns:
             Dictionary with task information and file paths
         """
         
-        task_id = int(time.time())
+        task_id = new_task_id()
         task_info = {
             "id": task_id,
             "user_id": user_id,
             "timestamp": time.time(),
             "status": "sandboxed",
             "files": [],
-            "errors": []
+            "errors": list(task_data.get("patch_errors", []))
         }
+        if base_task_id is not None:
+            task_info["base_task_id"] = base_task_id
+        if task_data.get("edit"):
+            task_info["edit"] = task_data["edit"]
         
         try:
             files_data = task_data.get("files", {})
             
+            # Results of the version being edited let unchanged files and checks be skipped
+            base_cache = CheckCache(base_task_id)
+            check_cache = CheckCache(task_id)
+            
             for file_path, content in files_data.items():
                 full_path = os.path.join(os.getcwd(), file_path)
                 
                 # Create directory if it doesn't exist
                 os.makedirs(os.path.dirname(full_path), exist_ok=True)
                 
-                # Backup existing file if it exists
-                if os.path.exists(full_path):
-                    backup_file(full_path)
+                # Snapshot the previous version (or its absence) for undo
+                backup_file(full_path, task_id)
                 
                 # Write new content
-                with open(full_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
+                get_store("sandbox").write_sync(full_path, content)
+                snapshot_store.record(task_id, full_path, "after")
                 
                 task_info["files"].append(full_path)
-                
-                # Run regression checker
-                check_result = regression_checker.comprehensive_check(full_path)
+            
+            # Lint every file in one run, then check them
+            regression_checker.lint_batch(task_info["files"])
+            for file_path, full_path in zip(files_data, task_info["files"]):
+                check_result, check_state = regression_checker.incremental_check(
+                    full_path, base_cache.get(full_path)
+                )
+                check_cache.put(full_path, check_state)
                 if not check_result.passed:
                     task_info["errors"].append({
                         "file": file_path,
                         "message": f"Quality check failed (Score: {check_result.score}/100)",
-                        "details": check_result.errors + check_result.warnings
+                        "details": check_result.issues(full_path)
                     })
             
+            check_cache.save()
+            
             # Log the task
             log_task(task_info)
             
@@ -79,6 +102,151 @@ class SandboxManager:
             return task_info
 
     
+    def find_edit_target(self, text: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Locate the plugin an EDIT request refers to and load its source
+        
+        A sandbox or plugin directory named in the text wins (sandbox
+        first, as it holds the newest copy); otherwise the user's latest
+        sandboxed task is used.
+        
+        Args:
+            text: The user's edit request
+            user_id: User ID who requested the edit
+            
+        Returns:
+            Dictionary with plugin name, source directory, files keyed by
+            their sandbox path and the task being edited, or None
+        """
+        
+        text_lower = text.lower()
+        name, source_dir, base_task_id = None, None, None
+        
+        for base in (self.sandbox_dir, self.plugins_dir):
+            if name or not os.path.isdir(base):
+                continue
+            for entry in sorted(os.listdir(base)):
+                entry_lower = entry.lower()
+                mentioned = (
+                    re.search(rf"\b{re.escape(entry_lower)}\b", text_lower)
+                    or entry_lower.replace("_", " ") in text_lower
+                )
+                if mentioned and os.path.isdir(os.path.join(base, entry)):
+                    name, source_dir = entry, os.path.join(base, entry)
+                    break
+        
+        if name is None:
+            tasks = get_pending_tasks(user_id)
+            if not tasks:
+                return None
+            base_task_id = tasks[-1]["id"]
+            name = self._extract_plugin_name(tasks[-1])
+            source_dir = os.path.join(self.sandbox_dir, name)
+        
+        if not os.path.isdir(source_dir):
+            return None
+        
+        if base_task_id is None:
+            base_task_id = self._latest_task_for(name)
+        
+        files = {}
+        for root, dirs, names in os.walk(source_dir):
+            dirs[:] = [d for d in dirs if d != "__pycache__"]
+            for filename in sorted(names):
+                if filename.endswith(".py"):
+                    path = os.path.join(root, filename)
+                    rel_path = os.path.relpath(path, source_dir)
+                    with open(path, 'r', encoding='utf-8') as f:
+                        files[f"{self.sandbox_dir}/{name}/{rel_path}"] = f.read()
+        
+        if not files:
+            return None
+        
+        return {
+            "name": name,
+            "source_dir": source_dir,
+            "files": files,
+            "base_task_id": base_task_id
+        }
+    
+    def apply_edit(self, edit_result: Dict[str, Any], target: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+        """
+        Apply patches / replaced definitions from generate_edit to the
+        target's source and write the result to the sandbox
+        
+        Every patched Python file must still compile; files whose patch
+        does not apply are left untouched and reported as errors.
+        
+        Args:
+            edit_result: Output of JarvisEngine.generate_edit
+            target: Output of find_edit_target
+            user_id: User ID who requested the edit
+            
+        Returns:
+            Dictionary with task information, as create_sandbox_files
+        """
+        
+        original = target["files"]
+        changed = {}
+        errors = []
+        
+        def current(path):
+            return changed.get(path, original.get(path))
+        
+        for path, diff in edit_result.get("patches", {}).items():
+            if current(path) is None:
+                errors.append({"file": path, "message": "Patch targets an unknown file"})
+                continue
+            try:
+                changed[path] = apply_unified_diff(current(path), diff)
+            except PatchError as e:
+                errors.append({"file": path, "message": f"Patch failed: {e}"})
+        
+        for path, symbols in edit_result.get("symbols", {}).items():
+            for symbol, code in symbols.items():
+                if current(path) is None:
+                    errors.append({"file": path, "message": f"Cannot replace {symbol} in unknown file"})
+                    break
+                try:
+                    changed[path] = replace_symbol(current(path), symbol, code)
+                except (PatchError, SyntaxError) as e:
+                    errors.append({"file": path, "message": f"Replacing {symbol} failed: {e}"})
+        
+        for path, content in edit_result.get("files", {}).items():
+            changed[path] = content
+        
+        # Verify before anything touches the sandbox
+        for path, content in list(changed.items()):
+            if path.endswith(".py"):
+                try:
+                    compile(content, path, 'exec')
+                except SyntaxError as e:
+                    errors.append({"file": path, "message": f"Edited file does not compile: {e}"})
+                    del changed[path]
+        
+        if not changed:
+            return {"id": None, "files": [], "errors": errors or [{"message": "No changes applied"}]}
+        
+        # The task lists every file of the feature, so integrating it later
+        # stages the untouched modules too; their checks come from the base task
+        files = {**original, **changed}
+        
+        changed_lines = sum(
+            1 for path, content in changed.items()
+            for line in unified_diff((original.get(path) or "").splitlines(), content.splitlines(), lineterm="")
+            if line.startswith(("+", "-")) and not line.startswith(("+++", "---"))
+        )
+        
+        return self.create_sandbox_files({
+            "files": files,
+            "patch_errors": errors,
+            "edit": {
+                "source_dir": target["source_dir"],
+                "changed_files": sorted(changed),
+                "changed_lines": changed_lines
+            }
+        }, user_id, base_task_id=target["base_task_id"])
+    
     def test_sandbox_feature(self, task_id: int) -> Dict[str, Any]:
         """
         Test sandbox feature by attempting to import/validate code
@@ -136,7 +304,13 @@ class SandboxManager:
     
     def integrate_to_plugins(self, task_id: int, plugin_name: str = None) -> Dict[str, Any]:
         """
-        Move sandbox files to plugins directory
+        Move sandbox files to plugins directory as one transaction
+        
+        The new plugin directory is assembled in a staging directory next
+        to it and swapped in with renames, so a crash leaves either the old
+        plugin or the new one. A journal in the task directory records
+        each step; recover_integrations rolls an interrupted integration
+        back (before the swap) or forward (after it) on startup.
         
         Args:
             task_id: Task ID to integrate
@@ -146,66 +320,201 @@ class SandboxManager:
             Dictionary with integration results
         """
         
-        task = get_task_by_id(task_id)
+        # Claim the task so a concurrent integration of it (from any process) backs off
+        def claim(task):
+            if task.get("status") != "sandboxed":
+                return False
+            task["status"] = "integrating"
+        
+        try:
+            task = modify_task(task_id, claim)
+        except ConflictError as e:
+            return {"success": False, "error": str(e)}
         if not task:
             return {"success": False, "error": "Task not found"}
         
-        if task.get("status") != "sandboxed":
+        if task.get("status") != "integrating":
             return {"success": False, "error": "Task is not in sandbox state"}
         
+        journal = None
         try:
             # Determine plugin name
             if not plugin_name:
                 plugin_name = self._extract_plugin_name(task)
             
             plugin_dir = os.path.join(self.plugins_dir, plugin_name)
-            os.makedirs(plugin_dir, exist_ok=True)
+            journal = {
+                "task_id": task_id,
+                "state": "staging",
+                "plugin_dir": plugin_dir,
+                "staging_dir": os.path.join(self.plugins_dir, f".staging-{plugin_name}-{task_id}"),
+                "backup_dir": os.path.join(self.plugins_dir, f".old-{plugin_name}-{task_id}"),
+                "sandbox_files": [],
+                "moved_files": []
+            }
+            self._write_journal(journal)
             
-            moved_files = []
+            # Stage: current plugin contents overlaid with the task's files
+            staging_dir = journal["staging_dir"]
+            if os.path.exists(staging_dir):
+                shutil.rmtree(staging_dir)
+            if os.path.isdir(plugin_dir):
+                shutil.copytree(plugin_dir, staging_dir, ignore=shutil.ignore_patterns("__pycache__"))
+            else:
+                os.makedirs(staging_dir)
             
             for file_path in task.get("files", []):
-                if file_path.startswith("sandbox/"):
-                    # Get relative path within sandbox
-                    rel_path = os.path.relpath(file_path, "sandbox")
-                    
-                    # Skip the plugin directory part if it exists
-                    path_parts = rel_path.split(os.sep)
-                    if len(path_parts) > 1:
-                        filename = path_parts[-1]
-                    else:
-                        filename = rel_path
-                    
-                    dest_path = os.path.join(plugin_dir, filename)
-                    
-                    # Move file
-                    shutil.move(file_path, dest_path)
-                    moved_files.append(dest_path)
+                rel_path = self._plugin_relpath(file_path, plugin_name)
+                if rel_path is None:
+                    continue
+                dest_path = os.path.join(staging_dir, rel_path)
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                shutil.copy2(file_path, dest_path)
+                journal["sandbox_files"].append(file_path)
+                journal["moved_files"].append(os.path.join(plugin_dir, rel_path))
             
-            # Update task status
-            task["status"] = "integrated"
-            task["plugin_name"] = plugin_name
-            task["plugin_dir"] = plugin_dir
-            task["integrated_files"] = moved_files
+            # Nothing that would block the bot's event loop goes live
+            staged_files = []
+            for directory, dirs, names in os.walk(staging_dir):
+                dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+                staged_files.extend(os.path.join(directory, name) for name in names if name.endswith(".py"))
+            blocking = regression_checker.find_blocking_calls(staged_files, staging_dir)
+            if blocking:
+                self._rollback_integration(journal)
+                details = [
+                    format_blocking(finding, os.path.join(plugin_dir, os.path.relpath(finding["path"], staging_dir)))
+                    for finding in blocking[:5]
+                ]
+                return {
+                    "success": False,
+                    "error": "Blocking calls reachable from async handlers:\n" + "\n".join(f"• {d}" for d in details),
+                    "blocking_calls": blocking
+                }
             
-            # Update task in memory
-            self._update_task_status(task_id, task)
+            # Swap: the rename of staging into place is the commit point
+            journal["state"] = "swapping"
+            self._write_journal(journal)
+            if os.path.exists(plugin_dir):
+                os.replace(plugin_dir, journal["backup_dir"])
+            os.replace(staging_dir, plugin_dir)
             
-            # Clean up empty sandbox directories
-            self._cleanup_empty_dirs(os.path.join(self.sandbox_dir, plugin_name))
+            journal["state"] = "swapped"
+            self._write_journal(journal)
+            self._finish_integration(journal)
             
             return {
                 "success": True,
                 "plugin_name": plugin_name,
                 "plugin_dir": plugin_dir,
-                "moved_files": moved_files
+                "moved_files": journal["moved_files"]
             }
             
         except Exception as e:
+            if journal is None:
+                self._release_claim(task_id)
+            elif journal["state"] != "swapped":
+                self._rollback_integration(journal)
             return {
                 "success": False,
                 "error": capture_exception(e)
             }
     
+    def recover_integrations(self) -> List[int]:
+        """
+        Complete or undo integrations interrupted by a crash
+        
+        Returns:
+            IDs of the tasks whose integration was recovered
+        """
+        
+        recovered = []
+        for entry in (os.listdir(TASK_DIR) if os.path.isdir(TASK_DIR) else []):
+            path = os.path.join(TASK_DIR, entry, "integration.json")
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path) as f:
+                    journal = json.load(f)
+                
+                if journal["state"] == "swapping" and os.path.isdir(journal["plugin_dir"]) \
+                        and not os.path.exists(journal["staging_dir"]):
+                    journal["state"] = "swapped"
+                
+                if journal["state"] == "swapped":
+                    self._finish_integration(journal)
+                else:
+                    self._rollback_integration(journal)
+                recovered.append(journal["task_id"])
+            except Exception as e:
+                print(f"Error recovering integration {entry}: {e}")
+        
+        # A crash between claiming a task and writing its journal leaves only the claim
+        from memory.memory_manager import load_tasks
+        for task in load_tasks():
+            if task.get("status") == "integrating" and not os.path.exists(self._journal_path(task["id"])):
+                self._release_claim(task["id"])
+                recovered.append(task["id"])
+        
+        return recovered
+    
+    def _plugin_relpath(self, file_path: str, plugin_name: str) -> Optional[str]:
+        """Path of a sandbox file inside its plugin, keeping nested directories"""
+        
+        if os.path.isabs(file_path):
+            file_path = os.path.relpath(file_path)
+        parts = os.path.normpath(file_path).split(os.sep)
+        if parts[0] != self.sandbox_dir or len(parts) < 2:
+            return None
+        if len(parts) > 2 and parts[1] == plugin_name:
+            return os.path.join(*parts[2:])
+        return parts[-1]
+    
+    def _journal_path(self, task_id: int) -> str:
+        return os.path.join(TASK_DIR, str(task_id), "integration.json")
+    
+    def _write_journal(self, journal: Dict[str, Any]):
+        get_store("tasks").write_sync(self._journal_path(journal["task_id"]), json.dumps(journal))
+    
+    def _finish_integration(self, journal: Dict[str, Any]):
+        """Roll a swapped integration forward: task status, then cleanup"""
+        
+        if not self._update_task_status(journal["task_id"], {
+            "status": "integrated",
+            "plugin_name": os.path.basename(journal["plugin_dir"]),
+            "plugin_dir": journal["plugin_dir"],
+            "integrated_files": journal["moved_files"]
+        }):
+            raise OSError("Task status could not be saved; integration will finish on restart")
+        
+        if os.path.exists(journal["backup_dir"]):
+            shutil.rmtree(journal["backup_dir"])
+        for file_path in journal["sandbox_files"]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        self._cleanup_empty_dirs(os.path.join(self.sandbox_dir, os.path.basename(journal["plugin_dir"])))
+        os.remove(self._journal_path(journal["task_id"]))
+    
+    def _rollback_integration(self, journal: Dict[str, Any]):
+        """Undo an integration that had not reached its commit point"""
+        
+        if not os.path.exists(journal["plugin_dir"]) and os.path.exists(journal["backup_dir"]):
+            os.replace(journal["backup_dir"], journal["plugin_dir"])
+        if os.path.exists(journal["staging_dir"]):
+            shutil.rmtree(journal["staging_dir"])
+        self._release_claim(journal["task_id"])
+        if os.path.exists(self._journal_path(journal["task_id"])):
+            os.remove(self._journal_path(journal["task_id"]))
+    
+    def _release_claim(self, task_id: int):
+        """Return a task claimed for integration to the sandbox"""
+        
+        def release(task):
+            if task.get("status") != "integrating":
+                return False
+            task["status"] = "sandboxed"
+        
+        modify_task(task_id, release)
+    
     def list_sandbox_tasks(self, user_id: int = None) -> List[Dict[str, Any]]:
         """
         List all sandbox tasks, optionally filtered by user
@@ -249,8 +558,7 @@ class SandboxManager:
                     os.remove(file_path)
             
             # Update task status
-            task["status"] = "cleaned"
-            self._update_task_status(task_id, task)
+            self._update_task_status(task_id, {"status": "cleaned"})
             
             return True
             
@@ -267,6 +575,8 @@ class SandboxManager:
         
         # Try to extract from sandbox path
         for file_path in files:
+            if os.path.isabs(file_path):
+                file_path = os.path.relpath(file_path)
             if file_path.startswith("sandbox/"):
                 parts = file_path.split("/")
                 if len(parts) > 1:
@@ -274,25 +584,25 @@ class SandboxManager:
         
         return f"plugin_{task['id']}"
     
-    def _update_task_status(self, task_id: int, updated_task: Dict[str, Any]):
-        """Update task status in memory"""
+    def _latest_task_for(self, plugin_name: str) -> Optional[int]:
+        """ID of the newest task that produced the given plugin"""
+        
+        from memory.memory_manager import load_tasks
         
-        from memory.memory_manager import MEMORY_FILE
+        for task in reversed(load_tasks()):
+            if task.get("plugin_name") == plugin_name or self._extract_plugin_name(task) == plugin_name:
+                return task["id"]
+        return None
+    
+    def _update_task_status(self, task_id: int, changes: Dict[str, Any]) -> bool:
+        """Apply changes to a task in memory; returns False if they could not be saved"""
         
         try:
-            with open(MEMORY_FILE, 'r') as f:
-                tasks = json.load(f)
-            
-            for i, task in enumerate(tasks):
-                if task.get("id") == task_id:
-                    tasks[i] = updated_task
-                    break
-            
-            with open(MEMORY_FILE, 'w') as f:
-                json.dump(tasks, f, indent=2)
+            return modify_task(task_id, lambda task: task.update(changes)) is not None
                 
         except Exception as e:
             print(f"Error updating task status: {e}")
+            return False
     
     def _cleanup_empty_dirs(self, dir_path: str):
         """Remove empty directories recursively"""
@@ -1,30 +1,26 @@
 import json
-import shutil
 import os
 from memory.memory_manager import log_task
+from memory.snapshot_store import snapshot_store
 
 TASK_DIR = "logs/tasks"
 os.makedirs(TASK_DIR, exist_ok=True)
 
 
-def backup_file(path):
-    if os.path.exists(path):
-        shutil.copy(path, path + ".bak")
+def backup_file(path, task_id=None):
+    """Snapshot path; with a task_id it is recorded as the task's 'before' state"""
+    if task_id is not None:
+        return snapshot_store.record(task_id, path, "before")
+    return snapshot_store.snapshot_file(path)
 
 
-def restore_file(path):
-    bak = path + ".bak"
-    if os.path.exists(bak):
-        shutil.copy(bak, path)
-        return True
-    return False
+def restore_file(path, steps=1):
+    return snapshot_store.restore_file(path, steps)
 
 
 def diff_file(path):
-    bak = path + ".bak"
-    if not os.path.exists(bak):
-        return "No backup found."
-    with open(path, 'r') as f1, open(bak, 'r') as f2:
-        from difflib import unified_diff
-        diff = list(unified_diff(f2.readlines(), f1.readlines(), fromfile="original", tofile="current"))
-    return "".join(diff) or "No differences."
\ No newline at end of file
+    return snapshot_store.diff_file(path)
+
+
+def diff_tasks(task_a, task_b):
+    return snapshot_store.diff_tasks(task_a, task_b)
@@ -1,27 +1,39 @@
-import google.generativeai as genai
 import os
 import json
+import tempfile
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
-from modules.file_manager import clean_code_blocks
+from typing import Dict, Any, Optional, Callable
+from core.llm_client import llm_client
+from core.prompt_builder import PromptBuilder, CodeChunk, chunk_code, pack_chunks, count_tokens, outline_code, traceback_lines
+from core.role_manager import settings
+from modules.file_manager import clean_code_blocks, clean_json_response
+from modules.json_stream import StreamingFilesExtractor
+from modules.regression_checker import regression_checker
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
-
 class JarvisEngine:
     def __init__(self):
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
-        self.conversation_model = genai.GenerativeModel("gemini-1.5-flash")
+        llm_settings = settings.get("llm", {})
+        gemini_settings = llm_settings.get("gemini", {})
+        self.model = gemini_settings.get("model", "gemini-1.5-flash")
+        self.conversation_model = gemini_settings.get("conversation_model", self.model)
+        self.review_chunk_tokens = llm_settings.get("review_chunk_tokens", 1500)
+        self.review_concurrency = llm_settings.get("review_concurrency", 4)
         
-    def generate_code(self, description: str, previous_error: str = None, task_type: str = "CREATE") -> Dict[str, Any]:
-        """Generate code based on description and return structured response"""
+    def generate_code(self, description: str, previous_error: str = None, task_type: str = "CREATE",
+                      on_file: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+        """Generate code based on description and return structured response.
+
+        The response is streamed; each file is quality-checked (and handed to
+        on_file) as soon as its content is complete.
+        """
         
         base_prompt = f"""
         You are JARVIS, an AI that generates Pyrogram Telegram bot modules.
@@ -52,43 +64,102 @@ class JarvisEngine:
         elif task_type == "RECODE":
             base_prompt += "\n\nThis is a complete recode request. Rewrite from scratch."
         
+        quality_issues = {}
+
+        def check_file(file_path: str, content: str):
+            """Quality-check a file as soon as the stream completes it"""
+            # A file of its own: identical requests can be checked at the same time
+            fd, temp_file = tempfile.mkstemp(prefix="jarvis_check_", suffix=".py")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                check_result = regression_checker.comprehensive_check(temp_file)
+                if not check_result.passed:
+                    quality_issues[file_path] = {
+                        "score": check_result.score,
+                        "errors": check_result.errors,
+                        "warnings": check_result.warnings
+                    }
+            finally:
+                os.remove(temp_file)  # Clean up
+
+        def handle_file(file_path: str, content: str):
+            check_file(file_path, content)
+            if on_file:
+                on_file(file_path, content)
+
         try:
-            response = self.model.generate_content(base_prompt)
-            response_text = response.text.strip()
-    
-            # Clean and parse JSON response
-            cleaned_response = self._clean_json_response(response_text)
-            result = json.loads(cleaned_response)
-    
+            extractor = StreamingFilesExtractor(on_file=handle_file)
+            chunks = []
+            for chunk in llm_client.stream(base_prompt, model=self.model):
+                chunks.append(chunk)
+                extractor.feed(chunk)
+            response_text = "".join(chunks).strip()
+
+            result = extractor.close()
+
             # Log AI activity
             self._log_ai_activity(description, response_text, task_type)
-    
-            # Run quality checks on each generated file
-            if "files" in result:
-                result["quality_issues"] = {}  # Store issues file-wise
-                for file_path, content in result["files"].items():
-                    # Save as temporary file for checking
-                    temp_file = f"temp_{file_path.replace('/', '_')}"
-                    with open(temp_file, 'w', encoding='utf-8') as f:
-                        f.write(content)
-    
-                    check_result = regression_checker.comprehensive_check(temp_file)
-                    if not check_result.passed:
-                        result["quality_issues"][file_path] = {
-                            "score": check_result.score,
-                            "errors": check_result.errors,
-                            "warnings": check_result.warnings
-                        }
-    
-                    os.remove(temp_file)  # Clean up
-    
+
+            if "error" in result:
+                logger.error(f"Code generation error: {result['error']}")
+                return result
+
+            result["quality_issues"] = quality_issues  # Store issues file-wise
+            if extractor.errors:
+                result["parse_warnings"] = extractor.errors
+
             return result
-    
+
         except Exception as e:
             logger.error(f"Code generation error: {e}")
             return {"error": str(e), "files": {}}
 
     
+    def generate_edit(self, description: str, existing_files: Dict[str, str]) -> Dict[str, Any]:
+        """Ask for a minimal edit (diffs or replaced definitions) to existing files.
+
+        Output tokens scale with the size of the change instead of the
+        size of the plugin.
+        """
+        
+        builder = PromptBuilder()
+        builder.add(f"""
+        You are JARVIS, editing an existing Pyrogram Telegram bot plugin.
+        
+        Task: {description}
+        
+        CRITICAL RULES:
+        1. Output ONLY valid JSON in this exact format, omitting keys you don't need:
+        {{
+          "patches": {{"sandbox/module_name/handler.py": "unified diff with @@ hunks and 2-3 context lines"}},
+          "symbols": {{"sandbox/module_name/handler.py": {{"function_name": "complete new definition"}}}},
+          "files": {{"sandbox/module_name/new_file.py": "complete code, ONLY for new files"}}
+        }}
+        
+        2. Use "symbols" to rewrite a whole function or class (Parent.name for nested ones),
+           "patches" for small line edits
+        3. NEVER repeat unchanged code, NO markdown formatting, NO explanations
+        4. Keep register_handlers(app, bot) working
+        
+        Current files:
+        """)
+        for path, content in existing_files.items():
+            builder.add_code(content, title=f"--- {path}")
+        
+        try:
+            response_text = llm_client.generate(builder.build(), model=self.model)
+            self._log_ai_activity(description, response_text, "EDIT")
+            
+            result = json.loads(self._clean_json_response(response_text), strict=False)
+            if not any(result.get(key) for key in ("patches", "symbols", "files")):
+                return {"error": "Model returned no changes", "files": {}}
+            return result
+        
+        except Exception as e:
+            logger.error(f"Edit generation error: {e}")
+            return {"error": str(e), "files": {}}
+    
     def generate_module_code(self, description: str, previous_error: str = None) -> str:
         """Generate module code and return as string (legacy compatibility)"""
         
@@ -97,16 +168,18 @@ class JarvisEngine:
             prompt += f"\n\nPrevious error: {previous_error}"
         
         try:
-            response = self.model.generate_content(prompt)
-            return clean_code_blocks(response.text.strip())
+            response = llm_client.generate(prompt, model=self.model)
+            return clean_code_blocks(response)
         except Exception as e:
             logger.error(f"Module generation error: {e}")
             return f"# Error generating module: {e}"
     
-    def generate_conversation_response(self, user_message: str, chat_history: list = None) -> str:
+    def generate_conversation_response(self, user_message: str, chat_history: list = None,
+                                       summary: str = None) -> str:
         """Generate natural conversation response"""
         
-        prompt = f"""
+        builder = PromptBuilder()
+        builder.add(f"""
         You are JARVIS, an intelligent AI assistant for a Telegram bot.
         
         User message: {user_message}
@@ -118,29 +191,60 @@ class JarvisEngine:
         - Be conversational and friendly
         
         Keep responses concise but informative.
-        """
+        """)
+        
+        if summary:
+            builder.add(f"\nSummary of the earlier conversation:\n{summary}")
         
         if chat_history:
-            history_text = "\n".join([f"User: {msg.get('content', '')}" for msg in chat_history[-5:] if msg.get('role') == 'user'])
-            prompt += f"\n\nRecent conversation:\n{history_text}"
+            # The caller usually appends the current message already
+            if chat_history[-1].get("role") == "user" and chat_history[-1].get("content") == user_message:
+                chat_history = chat_history[:-1]
+            builder.add_history(chat_history, title="\nRecent conversation:")
         
         try:
-            response = self.conversation_model.generate_content(prompt)
-            return response.text.strip()
+            return llm_client.generate(builder.build(), model=self.conversation_model)
         except Exception as e:
             logger.error(f"Conversation generation error: {e}")
             return "I apologize, but I'm having trouble processing your request right now."
     
+    def summarize_conversation(self, previous_summary: str, messages: list, max_tokens: int = 400) -> str:
+        """Fold older conversation turns into the running summary"""
+        
+        builder = PromptBuilder()
+        builder.add(f"""
+        Update the running summary of a conversation between a user and JARVIS.
+        Keep facts, preferences, names, decisions and open questions. Drop small talk.
+        Answer with the summary only, in at most {max_tokens} tokens.
+        """)
+        if previous_summary:
+            builder.add(f"Current summary:\n{previous_summary}")
+        builder.add_history(messages, title="\nNew turns to fold in:")
+        
+        try:
+            return llm_client.generate(builder.build(), model=self.conversation_model)
+        except Exception as e:
+            logger.error(f"Conversation summary error: {e}")
+            return ""
+    
     def review_code(self, file_path: str, code_content: str) -> str:
-        """Review code and provide suggestions"""
+        """Review code and provide suggestions.
+
+        Files above review_chunk_tokens are split per function/class,
+        reviewed concurrently and the findings merged, so wall time follows
+        the largest chunk rather than the file size.
+        """
         
-        prompt = f"""
-        Review this Pyrogram bot code and provide concise suggestions for improvement:
+        if count_tokens(code_content) > self.review_chunk_tokens:
+            return self._review_chunks({file_path: code_content})
         
-        File: {file_path}
-        Code:
-        {code_content}
+        builder = PromptBuilder()
+        builder.add(f"""
+        Review this Pyrogram bot code and provide concise suggestions for improvement:
         
+        File: {file_path}""")
+        builder.add_code(code_content, title="Code:")
+        builder.add("""
         Focus on:
         - Code quality and best practices
         - Potential bugs or issues
@@ -149,52 +253,121 @@ class JarvisEngine:
         - Pyrogram-specific optimizations
         
         Keep response concise and actionable.
-        """
+        """)
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return llm_client.generate(builder.build(), model=self.model)
         except Exception as e:
             logger.error(f"Code review error: {e}")
             return f"Error reviewing code: {e}"
     
-    def debug_error(self, error_traceback: str, code_context: str = None) -> str:
-        """Generate debug suggestions for errors"""
+    def review_plugin(self, plugin_dir: str) -> str:
+        """Map-reduce review of every Python file in a plugin directory"""
         
-        prompt = f"""
-        Analyze this error and provide debugging suggestions:
+        files = {}
+        for root, dirs, names in os.walk(plugin_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith((".", "__pycache__")))
+            for name in sorted(names):
+                if name.endswith(".py"):
+                    path = os.path.join(root, name)
+                    with open(path, "r", encoding="utf-8") as f:
+                        files[path] = f.read()
         
-        Error:
-        {error_traceback}
+        if not files:
+            return "No Python files found."
+        return self._review_chunks(files)
+    
+    def _review_chunks(self, files: Dict[str, str]) -> str:
+        """Review AST-aware chunks of the given files under a concurrency cap"""
         
-        """
+        jobs = []
+        for path, code in files.items():
+            outline = outline_code(code)
+            chunks = chunk_code(code, max_tokens=self.review_chunk_tokens)
+            for chunk in pack_chunks(chunks, self.review_chunk_tokens):
+                jobs.append((path, outline, chunk))
+        
+        workers = max(1, min(self.review_concurrency, len(jobs)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            findings = list(pool.map(lambda job: self._review_chunk(*job), jobs))
+        
+        return self._merge_reviews(jobs, findings, len(files))
+    
+    def _review_chunk(self, file_path: str, outline: str, chunk: CodeChunk) -> str:
+        builder = PromptBuilder()
+        builder.add(f"""
+        You are reviewing one part of a Pyrogram bot file.
+        
+        File: {file_path}
+        Outline of the whole file:
+        {outline or "(unavailable)"}
+        
+        Part: {chunk.name} (lines {chunk.start}-{chunk.end})""")
+        builder.add_code(chunk.text, title="Code:")
+        builder.add("""
+        Only report problems in this part: bugs, blocking calls in async code,
+        security issues, performance and Pyrogram-specific mistakes.
+        Answer with at most 5 lines starting with "- ", or exactly "No issues."
+        """)
+        
+        try:
+            return llm_client.generate(builder.build(), model=self.model)
+        except Exception as e:
+            logger.error(f"Code review error in {file_path} ({chunk.name}): {e}")
+            return f"- Review failed for this part: {e}"
+    
+    def _merge_reviews(self, jobs: list, findings: list, file_count: int) -> str:
+        """Group findings by file and part, dropping duplicates across chunks"""
+        
+        seen = set()
+        sections = {}
+        for (path, _, chunk), text in zip(jobs, findings):
+            bullets = []
+            for line in text.splitlines():
+                line = line.strip().lstrip("-•* ").strip()
+                if not line or line.lower().rstrip(".") == "no issues":
+                    continue
+                key = line.lower()
+                if key not in seen:
+                    seen.add(key)
+                    bullets.append(line)
+            if bullets:
+                sections.setdefault(path, []).append((chunk, bullets))
+        
+        header = f"🔍 Review of {len(jobs)} parts in {file_count} file(s)"
+        if not sections:
+            return f"{header}\n✅ No issues found."
+        
+        output = [header]
+        for path, parts in sections.items():
+            output.append(f"\n📄 {path}")
+            for chunk, bullets in parts:
+                output.append(f"▸ {chunk.name} (L{chunk.start}-{chunk.end})")
+                output.extend(f"  • {bullet}" for bullet in bullets)
+        return "\n".join(output)
+    
+    def debug_error(self, error_traceback: str, code_context: str = None) -> str:
+        """Generate debug suggestions for errors"""
+        
+        builder = PromptBuilder()
+        builder.add("Analyze this error and provide debugging suggestions:\n")
+        # The innermost frames and the exception itself are at the end
+        builder.add_text(error_traceback, title="Error:", keep="tail")
         
         if code_context:
-            prompt += f"\nCode context:\n{code_context}"
+            builder.add_code(code_context, title="\nCode context:", focus_lines=traceback_lines(error_traceback))
         
-        prompt += "\nProvide specific steps to fix this error."
+        builder.add("\nProvide specific steps to fix this error.")
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return llm_client.generate(builder.build(), model=self.model)
         except Exception as e:
             logger.error(f"Debug generation error: {e}")
             return f"Error generating debug suggestions: {e}"
     
     def _clean_json_response(self, response: str) -> str:
         """Clean AI response to extract valid JSON"""
-        
-        # Remove markdown formatting
-        response = clean_code_blocks(response)
-        
-        # Find JSON content
-        start_idx = response.find('{')
-        end_idx = response.rfind('}')
-        
-        if start_idx != -1 and end_idx != -1:
-            return response[start_idx:end_idx+1]
-        
-        return response
+        return clean_json_response(response)
     
     def _log_ai_activity(self, prompt: str, response: str, task_type: str):
         """Log AI interactions"""
@@ -1,14 +1,20 @@
+import asyncio
 from pyrogram import Client, filters
 from config.settings import API_ID, API_HASH, BOT_TOKEN
 from core.role_manager import set_bot_instance, is_dev
 from modules.command_router import register_commands
-from modules.plugin_loader import load_plugins
+from modules.plugin_loader import load_plugins, load_plugin
 from core.intent_classifier import intent_classifier
 from jarvis_engine import jarvis_engine  # Updated import
 from core.sandbox_manager import sandbox_manager
+from core.async_io import run_io
+from core.rate_limiter import rate_limiter, Overloaded
 from memory.access_control import has_access
-from memory.memory_manager import get_pending_tasks
-from memory.conversation_manager import get_chat_memory, save_chat_memory
+from memory.memory_manager import get_pending_tasks, task_lock
+from memory.conversation_manager import append_chat_messages
+from core.conversation_summarizer import conversation_summarizer
+from memory.retention import retention_manager
+from modules.file_watcher import file_watcher
 
 bot = Client("JarvisBot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
 set_bot_instance(bot)
@@ -23,6 +29,23 @@ async def handle_message(client, message):
         await message.reply("❌ Access denied.")
         return
 
+    # Per-user token bucket: cheap rejection before any classification or LLM call
+    allowed, retry_after, warn = rate_limiter.check(user_id)
+    if not allowed:
+        if warn:
+            await message.reply(f"🐢 Slow down! Try again in {max(1, round(retry_after))}s.")
+        return
+
+    try:
+        async with rate_limiter.slot(lambda: message.reply("⏳ Busy right now, your message is queued.")):
+            await dispatch_message(client, message, user_text)
+    except Overloaded:
+        await message.reply("🚦 Too many requests right now, please try again in a minute.")
+
+
+async def dispatch_message(client, message, user_text):
+    user_id = message.from_user.id
+
     # Intent classification
     intent, metadata = intent_classifier.classify_intent(
         user_text, user_id, is_dev=is_dev(user_id)
@@ -47,13 +70,15 @@ async def handle_message(client, message):
 async def handle_create_intent(client, message, user_text):
     await message.reply("🔧 Generating code...")
     
-    result = jarvis_engine.generate_code(user_text, task_type="CREATE")
+    # LLM calls run off the event loop, so other messages (and identical ones to coalesce) keep flowing
+    result = await asyncio.to_thread(jarvis_engine.generate_code, user_text, task_type="CREATE")
 
     if "error" in result:
         await message.reply(f"❌ Error: {result['error']}")
         return
 
-    task_info = sandbox_manager.create_sandbox_files(result, message.from_user.id)
+    # Writing the files also runs the quality checks, too slow for the small run_io disk pool
+    task_info = await asyncio.to_thread(sandbox_manager.create_sandbox_files, result, message.from_user.id)
 
     if task_info["errors"]:
         error_msg = "\n".join(
@@ -73,29 +98,44 @@ async def handle_create_intent(client, message, user_text):
 
 async def handle_edit_intent(client, message, user_text):
     await message.reply("🔧 Editing code...")
-    result = jarvis_engine.generate_code(user_text, task_type="EDIT")
+
+    # Patch the existing plugin when we can find it; otherwise regenerate
+    target = await run_io(sandbox_manager.find_edit_target, user_text, message.from_user.id)
+    if target:
+        result = await asyncio.to_thread(jarvis_engine.generate_edit, user_text, target["files"])
+    else:
+        result = await asyncio.to_thread(jarvis_engine.generate_code, user_text, task_type="EDIT")
 
     if "error" in result:
         await message.reply(f"❌ Error: {result['error']}")
         return
 
-    task_info = sandbox_manager.create_sandbox_files(result, message.from_user.id)
-    if task_info["errors"]:
+    if target:
+        task_info = await asyncio.to_thread(sandbox_manager.apply_edit, result, target, message.from_user.id)
+    else:
+        task_info = await asyncio.to_thread(sandbox_manager.create_sandbox_files, result, message.from_user.id)
+
+    if task_info["id"] is None:
+        error_msg = "\n".join([f"• {e.get('message', str(e))}" for e in task_info["errors"]])
+        await message.reply(f"❌ Edit could not be applied:\n{error_msg}")
+    elif task_info["errors"]:
         error_msg = "\n".join([f"• {e.get('message', str(e))}" for e in task_info["errors"]])
         await message.reply(f"⚠️ Edited with issues:\n{error_msg}")
     else:
-        await message.reply(f"✅ Code edited! Task ID: {task_info['id']}\nSay 'integrate it' to move to plugins.")
+        changed = task_info.get("edit", {}).get("changed_lines")
+        summary = f" ({changed} lines changed)" if changed is not None else ""
+        await message.reply(f"✅ Code edited{summary}! Task ID: {task_info['id']}\nSay 'integrate it' to move to plugins.")
 
 
 async def handle_recode_intent(client, message, user_text):
     await message.reply("🔧 Recoding from scratch...")
-    result = jarvis_engine.generate_code(user_text, task_type="RECODE")
+    result = await asyncio.to_thread(jarvis_engine.generate_code, user_text, task_type="RECODE")
 
     if "error" in result:
         await message.reply(f"❌ Error: {result['error']}")
         return
 
-    task_info = sandbox_manager.create_sandbox_files(result, message.from_user.id)
+    task_info = await asyncio.to_thread(sandbox_manager.create_sandbox_files, result, message.from_user.id)
     if task_info["errors"]:
         error_msg = "\n".join([f"• {e.get('message', str(e))}" for e in task_info["errors"]])
         await message.reply(f"⚠️ Recoded with issues:\n{error_msg}")
@@ -110,27 +150,45 @@ async def handle_integrate_intent(client, message, metadata):
         return
 
     latest_task = pending_tasks[-1]
-    result = sandbox_manager.integrate_to_plugins(latest_task["id"])
+    async with task_lock(latest_task["id"]):
+        result = await asyncio.to_thread(sandbox_manager.integrate_to_plugins, latest_task["id"])
 
     if result["success"]:
-        await message.reply(f"✅ Integrated to `plugins/{result['plugin_name']}`.")
+        # Activate (or replace) the plugin's handlers without a restart
+        if load_plugin(client, result["plugin_name"]):
+            await message.reply(f"✅ Integrated to `plugins/{result['plugin_name']}` and activated.")
+        else:
+            await message.reply(f"✅ Integrated to `plugins/{result['plugin_name']}`, but its handlers failed to "
+                                f"register; any previously loaded version stays active until restart.")
     else:
         await message.reply(f"❌ Integration failed: {result['error']}")
 
 
 async def handle_conversation(client, message, user_text):
-    memory = get_chat_memory(message.from_user.id)
-    memory.append({"role": "user", "content": user_text})
+    chat_id = message.from_user.id
+    context = await run_io(conversation_summarizer.get_context, chat_id)
 
-    response = jarvis_engine.generate_conversation_response(user_text, memory)
+    response = await asyncio.to_thread(
+        jarvis_engine.generate_conversation_response,
+        user_text, context["recent"], summary=context["summary"]
+    )
 
-    memory.append({"role": "assistant", "content": response})
-    save_chat_memory(message.from_user.id, memory)
+    memory = await run_io(append_chat_messages, chat_id, [
+        {"role": "user", "content": user_text},
+        {"role": "assistant", "content": response},
+    ])
 
     await message.reply(response)
 
+    # Compact older turns in the background so later prompts stay small
+    if conversation_summarizer.needs_summary(memory):
+        conversation_summarizer.schedule(asyncio.get_running_loop(), chat_id)
+
 
 if __name__ == "__main__":
+    sandbox_manager.recover_integrations()
+    retention_manager.start_background()
+    file_watcher.start()
     load_plugins(bot)
     register_commands(bot)
     print("🚀 Jarvis is starting...")
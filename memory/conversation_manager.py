@@ -1,15 +1,52 @@
 import json
-import os
+import threading
+from core.async_io import get_store
+
+CONVERSATION_DIR = "logs/conversations"
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def chat_lock(chat_id):
+    """Lock serializing read-modify-write of one chat's files"""
+    with _locks_guard:
+        return _locks.setdefault(chat_id, threading.RLock())
+
+def _memory_path(chat_id):
+    return f"{CONVERSATION_DIR}/{chat_id}.json"
+
+def _summary_path(chat_id):
+    return f"{CONVERSATION_DIR}/{chat_id}.summary.json"
+
+# Writes are coalesced in the background; reads see pending data first
+_store = get_store("conversations")
 
 def get_chat_memory(chat_id):
-    path = f"logs/conversations/{chat_id}.json"
-    if os.path.exists(path):
-        with open(path) as f:
-            return json.load(f)
-    return []
+    data = _store.read(_memory_path(chat_id))
+    return json.loads(data) if data else []
 
 def save_chat_memory(chat_id, memory):
-    path = f"logs/conversations/{chat_id}.json"
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(memory, f, indent=2)
\ No newline at end of file
+    """Queue a write; returns a Future that resolves once it is on disk"""
+    return _store.write(_memory_path(chat_id), json.dumps(memory, indent=2))
+
+def append_chat_messages(chat_id, messages):
+    """Append to the stored history without overwriting concurrent compaction"""
+    with chat_lock(chat_id):
+        memory = get_chat_memory(chat_id)
+        memory.extend(messages)
+        save_chat_memory(chat_id, memory)
+        return memory
+
+def get_chat_summary(chat_id):
+    """Running summary of turns already compacted out of the history"""
+    data = _store.read(_summary_path(chat_id))
+    return json.loads(data) if data else {"summary": "", "summarized_messages": 0}
+
+def save_chat_summary(chat_id, summary):
+    return _store.write(_summary_path(chat_id), json.dumps(summary, indent=2))
+
+def clear_chat_memory(chat_id):
+    """Forget both the history and its summary"""
+    with chat_lock(chat_id):
+        save_chat_memory(chat_id, [])
+        save_chat_summary(chat_id, {"summary": "", "summarized_messages": 0})
@@ -1,52 +1,64 @@
-import json
 import os
+from memory.snapshot_store import snapshot_store
+from memory.task_store import ConflictError, task_lock, task_store
 
-MEMORY_FILE = "logs/memory.json"
+MEMORY_FILE = task_store.snapshot_path
 
-if not os.path.exists("logs"):
-    os.makedirs("logs")
+def save_tasks(tasks):
+    task_store.replace_all(tasks)
 
-if not os.path.exists(MEMORY_FILE):
-    with open(MEMORY_FILE, "w") as f:
-        json.dump([], f)
+def new_task_id():
+    return task_store.new_id()
+
+def update_task(task):
+    """Compare-and-swap save; raises ConflictError if the task changed since it was read"""
+    task_store.update(task)
+
+def modify_task(task_id, change):
+    """Read-change-save a task, retrying if another writer got there first"""
+    return task_store.modify(task_id, change)
+
+def purge_tasks(should_remove):
+    return task_store.purge(should_remove)
 
 def log_task(task):
-    with open(MEMORY_FILE, "r+") as f:
-        data = json.load(f)
-        data.append(task)
-        f.seek(0)
-        json.dump(data, f, indent=2)
+    task_store.add(task)
 
 def load_tasks():
-    with open(MEMORY_FILE, 'r') as f:
-        return json.load(f)
+    return task_store.all()
 
 def get_task_by_id(task_id):
-    tasks = load_tasks()
-    for t in tasks:
-        if t.get("id") == task_id:
-            return t
-    return None
-
-def restore_file(file_path): 
-    backup_path = f"{file_path}.bak"
-    if os.path.exists(backup_path):
-        with open(backup_path, "rb") as src, open(file_path, "wb") as dst:
-            dst.write(src.read())
-        return True
-    return False
+    return task_store.get(task_id)
+
+def restore_file(file_path, steps=1):
+    return snapshot_store.restore_file(file_path, steps)
 
 def revert_task(task_id):
     task = get_task_by_id(task_id)
     if not task:
         return False, "Task not found."
+    if snapshot_store.restore_task(task_id):
+        return True, "Task reverted."
+    # Tasks created before snapshots existed only have .bak copies
     for file in task["files"]:
-        restored = restore_file(file)
-        if not restored:
+        backup_path = f"{file}.bak"
+        if not os.path.exists(backup_path):
             return False, f"Backup not found for {file}"
+        with open(backup_path, "rb") as src, open(file, "wb") as dst:
+            dst.write(src.read())
     return True, "Task reverted."
 
+def query_tasks(**filters):
+    """Filtered, paginated tasks; see TaskStore.query for the options"""
+    return task_store.query(**filters)
+
+def cursor_generation():
+    """Changes whenever query cursors handed out before stop being valid"""
+    return task_store.generation
+
+def task_counts(user_id=None):
+    return task_store.counts(user_id)
+
 def get_pending_tasks(user_id):
     """Get pending tasks for a user"""
-    tasks = load_tasks()
-    return [task for task in tasks if task.get("user_id") == user_id and task.get("status") == "sandboxed"]
+    return task_store.query(user_id=user_id, status="sandboxed", limit=None, newest_first=False)["tasks"]
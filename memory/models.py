@@ -0,0 +1,253 @@
+import os
+import re
+import sys
+import copy
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# path:line[:col]: [CODE[:]] message, optionally behind a "Pylint ...: " label
+_LOCATED = re.compile(
+    r"^(?P<prefix>(?:Pylint(?: Error| Warning)?: )?)(?P<path>[^\s:][^:]*):(?P<line>\d+):(?:(?P<col>\d+):)? "
+    r"(?:(?P<code>[A-Z]+\d+|invalid-syntax)(?P<sep>:? ))?(?P<message>.*)$",
+    re.DOTALL,
+)
+
+
+class Issue:
+    """
+    One checker finding kept as code + line + message.
+
+    Checker output lines repeat the file path and tool label in every
+    finding; an Issue keeps only what varies. path is None when the
+    finding is about the file of the task error that holds it, which is
+    the common case. render() rebuilds the original line.
+    """
+
+    __slots__ = ("code", "line", "message", "col", "prefix", "path")
+
+    def __init__(self, message: str, code: Optional[str] = None, line: Optional[int] = None,
+                 col: Optional[int] = None, prefix: str = "", path: Optional[str] = None):
+        self.message = message
+        self.code = sys.intern(code) if code else None
+        self.line = line
+        self.col = col
+        self.prefix = sys.intern(prefix)
+        self.path = path
+
+    @classmethod
+    def parse(cls, text: str, file_path: Optional[str] = None) -> "Issue":
+        """
+        Issue for a checker output line about file_path (as the checker was given it)
+
+        Lines that cannot be rebuilt exactly are kept whole as the message,
+        so parse() followed by render(file_path) always returns text.
+        """
+        match = _LOCATED.match(text)
+        if match:
+            path = match["path"]
+            code = match["code"]
+            separator = match["sep"] or ""
+            # The separator after a code follows from the label; anything else is kept whole
+            if code is None or separator == (": " if match["prefix"] else " "):
+                issue = cls(match["message"], code, int(match["line"]),
+                            int(match["col"]) if match["col"] is not None else None,
+                            match["prefix"], None if path == file_path else path)
+                if issue.render(file_path) == text:
+                    return issue
+        return cls(text)
+
+    @property
+    def located(self) -> bool:
+        return self.line is not None
+
+    def render(self, file_path: Optional[str] = None) -> str:
+        """The checker output line this issue was parsed from"""
+        if not self.located:
+            return self.message
+        location = f"{self.path or file_path}:{self.line}:" + (f"{self.col}:" if self.col is not None else "")
+        code = ""
+        if self.code:
+            code = self.code + (": " if self.prefix else " ")
+        return f"{self.prefix}{location} {code}{self.message}"
+
+    def to_json(self) -> Union[str, List[Any]]:
+        """A plain string for unlocated issues, else [code, line, message, col, prefix, path] trimmed"""
+        if not self.located:
+            return self.message
+        data = [self.code, self.line, self.message, self.col, self.prefix, self.path]
+        while data[-1] in (None, "") and len(data) > 3:
+            data.pop()
+        return data
+
+    @classmethod
+    def from_json(cls, data: Union[str, List[Any]], file_path: Optional[str] = None) -> "Issue":
+        """Inverse of to_json(); a string is parsed, which also converts legacy output lines"""
+        if isinstance(data, str):
+            return cls.parse(data, file_path)
+        code, line, message = data[:3]
+        col, prefix, path = (list(data[3:]) + [None, "", None])[:3]
+        return cls(message, code, line, col, prefix or "", path)
+
+    def __eq__(self, other):
+        return isinstance(other, Issue) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __str__(self):
+        if not self.located:
+            return self.message
+        code = f"{self.code} " if self.code else ""
+        return f"{self.path + ':' if self.path else ''}{self.line}: {code}{self.message}"
+
+    def __repr__(self):
+        return f"Issue({self.to_json()!r})"
+
+
+def _checked_path(error: Dict[str, Any], files: Optional[List[str]]) -> Optional[str]:
+    """
+    The path an error's file was checked at: its entry in the task's
+    "files" (SandboxManager checks absolute paths, "file" is relative).
+    Taken from the record itself, so elided issue paths never depend on
+    the process's working directory.
+    """
+    file = error.get("file")
+    if not file:
+        return None
+    suffix = os.sep + os.path.normpath(file)
+    for path in files or ():
+        if path == file or path.endswith(suffix):
+            return path
+    return None
+
+
+class Task(MutableMapping):
+    """
+    A task record with its common fields in slots.
+
+    Behaves like the dict tasks used to be (task["status"], task.get(),
+    task.update(), ...), so callers are unaffected, while a store of many
+    tasks holds no per-task dict. Fields outside the slots (edit,
+    base_task_id, plugin_name, ...) live in a small overflow dict. The
+    "details" of each error are Issues in memory and compact lists on disk.
+    """
+
+    FIELDS = ("id", "user_id", "timestamp", "status", "files", "errors", "version")
+    __slots__ = FIELDS + ("_extra",)
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, **fields):
+        self._extra = None
+        data = dict(data or {}, **fields)
+        if "errors" in data:
+            # After "files", which locates the files the errors' issues are about
+            data["errors"] = data.pop("errors")
+        for key, value in data.items():
+            self[key] = value
+
+    # ----------------------------------------------------- mapping protocol
+
+    def __getitem__(self, key):
+        if key in Task.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in Task.FIELDS:
+            if key == "errors":
+                files = getattr(self, "files", None)
+                value = [self._load_error(error, files) for error in value]
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in Task.FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in Task.FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Task({self.to_json()!r})"
+
+    def copy(self) -> "Task":
+        """Copy that can be changed without affecting this task (Issues are shared)"""
+        task = Task.__new__(Task)
+        task._extra = None
+        for key in Task.FIELDS:
+            if hasattr(self, key):
+                value = getattr(self, key)
+                if key == "files":
+                    value = list(value)
+                elif key == "errors":
+                    value = [dict(error, details=list(error.get("details", ()))) if isinstance(error, dict)
+                             and "details" in error else copy.copy(error) for error in value]
+                setattr(task, key, value)
+        if self._extra:
+            task._extra = copy.deepcopy(self._extra)
+        return task
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    # -------------------------------------------------------- serialization
+
+    @staticmethod
+    def _load_error(error: Any, files: Optional[List[str]]) -> Any:
+        details = error.get("details") if isinstance(error, dict) else None
+        if not details or isinstance(details[0], Issue):
+            return error
+        path = _checked_path(error, files)
+        return dict(error, details=[Issue.from_json(detail, path) for detail in details])
+
+    @classmethod
+    def from_json(cls, data: Union["Task", Dict[str, Any]]) -> "Task":
+        """
+        Task from its stored form, or from a plain task dict in the
+        pre-Issue format (checker output lines as details), losslessly
+        """
+        if isinstance(data, Task):
+            return data
+        return cls(data)
+
+    def to_json(self) -> Dict[str, Any]:
+        """Compact, JSON-serializable form"""
+        data = {}
+        for key, value in self.items():
+            if key == "errors":
+                value = [
+                    dict(error, details=[issue.to_json() for issue in error["details"]])
+                    if isinstance(error, dict) and error.get("details") else error
+                    for error in value
+                ]
+            data[key] = value
+        return data
+
+    def to_legacy(self) -> Dict[str, Any]:
+        """The task as a plain dict with checker output lines as details"""
+        data = self.to_json()
+        for error in data.get("errors", []):
+            if isinstance(error, dict) and error.get("details"):
+                path = _checked_path(error, data.get("files"))
+                error["details"] = [Issue.from_json(detail, path).render(path) for detail in error["details"]]
+        return data
+
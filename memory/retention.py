@@ -0,0 +1,178 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import logging
+import threading
+from typing import Dict, Any, List
+from core.async_io import get_store
+from core.role_manager import settings
+from core.task_manager import TASK_DIR
+from memory.conversation_manager import CONVERSATION_DIR, chat_lock, get_chat_memory, save_chat_memory
+from memory.memory_manager import purge_tasks, query_tasks
+from memory.snapshot_store import snapshot_store
+
+logger = logging.getLogger(__name__)
+
+LOGS_DIR = "logs"
+ACTIVITY_LOG = "logs/ai_activity.log"
+
+DEFAULT_POLICY = {
+    "interval_hours": 24,
+    "archive_dir": "logs/archive",
+    "tasks": {"max_age_days": 30, "statuses": ["cleaned", "integrated"]},
+    "conversations": {"max_messages": 200},
+    "activity_log": {"max_bytes": 1_048_576, "keep_archives": 5},
+    "snapshots": {"keep_versions": 20},
+}
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class RetentionManager:
+    """
+    Keeps logs/ from growing forever.
+
+    Each run ages old finished tasks out of the task store (with their
+    check caches and snapshot manifests), caps conversation histories,
+    rolls the AI activity log into gzip archives and drops file versions
+    and snapshot blobs nothing needs any more. Everything removed from a
+    store is appended to a gzip archive under logs/archive first.
+    Policies come from the "retention" section of config/settings.json.
+    """
+
+    def __init__(self):
+        configured = settings.get("retention", {})
+        self.policy = {key: (dict(value, **configured.get(key, {})) if isinstance(value, dict)
+                             else configured.get(key, value))
+                       for key, value in DEFAULT_POLICY.items()}
+        self.archive_dir = self.policy["archive_dir"]
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+    def run(self) -> Dict[str, Any]:
+        """One maintenance pass; returns what was done and the bytes reclaimed"""
+        with self._run_lock:
+            before = _dir_size(LOGS_DIR)
+            purged_ids = self._age_out_tasks()
+            report = {
+                "tasks_archived": len(purged_ids),
+                "conversations_trimmed": self._cap_conversations(),
+                "logs_rotated": self._rotate_activity_log(),
+                "snapshot_bytes_freed": snapshot_store.prune(
+                    purged_ids, self.policy["snapshots"]["keep_versions"]
+                ),
+            }
+            report["bytes_reclaimed"] = max(0, before - _dir_size(LOGS_DIR))
+            logger.info(f"Maintenance: {report}")
+            return report
+
+    def _archive(self, name: str, records):
+        """Append records as JSON lines to logs/archive/<name>-<month>.jsonl.gz"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{name}-{time.strftime('%Y-%m')}.jsonl.gz")
+        with open(path, "ab") as raw:
+            with gzip.open(raw, "at", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            # Durable before the caller removes the records from their store
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def _age_out_tasks(self) -> List[int]:
+        policy = self.policy["tasks"]
+        cutoff = time.time() - policy["max_age_days"] * 86400
+        statuses = set(policy["statuses"])
+
+        def expired(task):
+            return task.get("status") in statuses and task.get("timestamp", 0) < cutoff
+
+        # Archive before purging, so a failure in between loses nothing (at
+        # worst a task is archived twice)
+        expiring = [task for status in statuses
+                    for task in query_tasks(status=status, until=cutoff, limit=None)["tasks"] if expired(task)]
+        if not expiring:
+            return []
+        self._archive("tasks", [task.to_json() for task in expiring])
+
+        # A task changed since it was archived stays; the next run archives it again
+        ids = {task["id"] for task in expiring}
+        removed = purge_tasks(lambda task: task.get("id") in ids and expired(task))
+        for task in removed:
+            task_dir = os.path.join(TASK_DIR, str(task["id"]))
+            if os.path.isdir(task_dir):
+                shutil.rmtree(task_dir)
+        return [task["id"] for task in removed]
+
+    def _cap_conversations(self) -> int:
+        max_messages = self.policy["conversations"]["max_messages"]
+        get_store("conversations").flush()  # Chats only in the write queue are not listed yet
+        if not os.path.isdir(CONVERSATION_DIR):
+            return 0
+
+        trimmed = 0
+        for name in os.listdir(CONVERSATION_DIR):
+            if not name.endswith(".json") or name.endswith(".summary.json"):
+                continue
+            chat_id = name[:-len(".json")]
+            # Handlers lock chats by their integer ID
+            chat_id = int(chat_id) if chat_id.lstrip("-").isdigit() else chat_id
+            with chat_lock(chat_id):
+                memory = get_chat_memory(chat_id)
+                if len(memory) <= max_messages:
+                    continue
+                overflow = len(memory) - max_messages
+                self._archive("conversations", [{"chat_id": chat_id, **message} for message in memory[:overflow]])
+                save_chat_memory(chat_id, memory[overflow:]).result()
+                trimmed += 1
+        return trimmed
+
+    def _rotate_activity_log(self) -> int:
+        policy = self.policy["activity_log"]
+        if not os.path.exists(ACTIVITY_LOG) or os.path.getsize(ACTIVITY_LOG) < policy["max_bytes"]:
+            return 0
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        # Rename first so writers start a fresh file while the old one is compressed
+        rotated = os.path.join(self.archive_dir, f"ai_activity-{time.strftime('%Y%m%d-%H%M%S')}.log")
+        os.replace(ACTIVITY_LOG, rotated)
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+
+        archives = sorted(name for name in os.listdir(self.archive_dir)
+                          if name.startswith("ai_activity-") and name.endswith(".log.gz"))
+        for name in archives[:max(0, len(archives) - policy["keep_archives"])]:
+            os.remove(os.path.join(self.archive_dir, name))
+        return 1
+
+    def start_background(self):
+        """Run maintenance every interval_hours in a daemon thread"""
+        if self._thread is not None:
+            return
+        interval = self.policy["interval_hours"] * 3600
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.run()
+                except Exception as e:
+                    logger.error(f"Maintenance failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="jarvis-maintenance", daemon=True)
+        self._thread.start()
+
+
+# Global instance
+retention_manager = RetentionManager()
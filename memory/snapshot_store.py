@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+from difflib import unified_diff
+from typing import Dict, List, Any, Optional
+from core.async_io import get_store
+from core.role_manager import settings
+from memory.wal import WriteAheadLog
+
+SNAPSHOT_DIR = "logs/snapshots"
+RACY_WINDOW_NS = 2_000_000_000
+
+
+class SnapshotStore:
+    """
+    Content-addressed, deduplicated file history.
+
+    Each distinct file content is stored once as a zlib-compressed blob
+    named by its SHA-256. A stat cache (mtime + size -> hash) means an
+    unchanged file is snapshotted with one stat call and no read or write.
+    Every task gets a manifest of the before/after hash of each file it
+    touched, and every path keeps a list of its versions, so any task or
+    file can be rolled back any number of steps and any two task versions
+    can be diffed.
+
+    The stat cache and histories (the index) are kept in index.json plus
+    an append-only index.log: each new version or stat entry appends one
+    record, and index.json is only rewritten every compact_every records
+    or when prune() trims the histories.
+    """
+
+    def __init__(self, root: str = SNAPSHOT_DIR, compact_every: Optional[int] = None):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.manifest_dir = os.path.join(root, "manifests")
+        self.index_path = os.path.join(root, "index.json")
+        self.compact_every = compact_every or settings.get("io", {}).get("wal_compact_every", 1000)
+        self.log = WriteAheadLog(os.path.join(root, "index.log"), fsync=get_store("snapshots").fsync)
+        self._lock = threading.RLock()
+        self._index = None
+
+    # ------------------------------------------------------------ storage
+
+    @property
+    def index(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._index is None:
+                index = {"stat": {}, "history": {}}
+                if os.path.exists(self.index_path):
+                    with open(self.index_path) as f:
+                        index = json.load(f)
+                self._index = index
+                for record in self.log.replay():
+                    self._apply(record)
+            return self._index
+
+    def _apply(self, record: Dict[str, Any]):
+        # Records from before the last compaction are already in index.json
+        if record.get("gen", 0) != self._index.get("generation", 0):
+            return
+        key = record["key"]
+        if record["op"] == "stat":
+            if record["value"] is None:
+                self._index["stat"].pop(key, None)
+            else:
+                self._index["stat"][key] = record["value"]
+        elif record["op"] == "version":
+            self._index["history"].setdefault(key, []).append(record["entry"])
+
+    def _log(self, op: str, key: str, **fields):
+        """Apply one index change and append it to index.log"""
+        record = {"op": op, "key": key, "gen": self.index.get("generation", 0), **fields}
+        self._apply(record)
+        if self.log.append(record) >= self.compact_every:
+            self.compact()
+
+    def _add_version(self, key: str, task_id: Optional[int], digest: str):
+        self._log("version", key, entry=[task_id, digest, time.time()])
+
+    def compact(self):
+        """Rewrite index.json with everything logged so far, then empty the log"""
+        with self._lock:
+            index = self.index
+            generation = index.get("generation", 0) + 1
+            get_store("snapshots").write_sync(self.index_path, json.dumps(dict(index, generation=generation)))
+            index["generation"] = generation
+            self.log.reset()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _write_blob(self, digest: str, data: bytes):
+        path = self._blob_path(digest)
+        if os.path.exists(path):
+            return
+        get_store("snapshots").write_sync(path, zlib.compress(data))
+
+    def read_blob(self, digest: str) -> bytes:
+        with open(self._blob_path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.relpath(path) if os.path.isabs(path) else os.path.normpath(path)
+
+    # ---------------------------------------------------------- snapshots
+
+    def snapshot_file(self, path: str) -> Optional[str]:
+        """Store the current content of path; returns its hash, None if missing"""
+        key = self._key(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            cached = self.index["stat"].get(key)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                return cached[2]
+
+            with open(path, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            self._write_blob(digest, data)
+            # A file modified within the mtime resolution could change again
+            # without its stat changing, so only trust settled files
+            if time.time_ns() - stat.st_mtime_ns > RACY_WINDOW_NS:
+                self._log("stat", key, value=[stat.st_mtime_ns, stat.st_size, digest])
+            elif key in self.index["stat"]:
+                self._log("stat", key, value=None)
+            return digest
+
+    def record(self, task_id: int, path: str, stage: str) -> Optional[str]:
+        """Snapshot path as the 'before' or 'after' state of a task"""
+        with self._lock:
+            digest = self.snapshot_file(path)
+            key = self._key(path)
+
+            manifest = self.load_manifest(task_id) or {
+                "task_id": task_id, "created": time.time(), "files": {}
+            }
+            manifest["files"].setdefault(key, {"before": None, "after": None})[stage] = digest
+            self._save_manifest(manifest)
+
+            if digest is not None:
+                history = self.index["history"].get(key)
+                if not history or history[-1][1] != digest:
+                    self._add_version(key, task_id, digest)
+            return digest
+
+    def load_manifest(self, task_id: int) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.manifest_dir, f"{task_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        path = os.path.join(self.manifest_dir, f"{manifest['task_id']}.json")
+        get_store("snapshots").write_sync(path, json.dumps(manifest))
+
+    def history(self, path: str) -> List[List[Any]]:
+        """[[task_id, hash, timestamp], ...] oldest first"""
+        return self.index["history"].get(self._key(path), [])
+
+    def prune(self, task_ids, keep_versions: int) -> int:
+        """
+        Forget the manifests of task_ids, keep only the newest keep_versions
+        of each file's history, and delete blobs nothing refers to any more.
+        Returns the number of bytes freed.
+        """
+        freed = 0
+        with self._lock:
+            for task_id in task_ids:
+                path = os.path.join(self.manifest_dir, f"{task_id}.json")
+                if os.path.exists(path):
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+
+            history = self.index["history"]
+            for key in list(history):
+                history[key] = history[key][-keep_versions:]
+
+            referenced = {entry[1] for versions in history.values() for entry in versions}
+            referenced.update(entry[2] for entry in self.index["stat"].values())
+            if os.path.isdir(self.manifest_dir):
+                for name in os.listdir(self.manifest_dir):
+                    if not name.endswith(".json"):
+                        continue
+                    with open(os.path.join(self.manifest_dir, name)) as f:
+                        for states in json.load(f)["files"].values():
+                            referenced.update(d for d in states.values() if d)
+
+            if os.path.isdir(self.blob_dir):
+                for prefix in os.listdir(self.blob_dir):
+                    for digest in os.listdir(os.path.join(self.blob_dir, prefix)):
+                        if digest not in referenced:
+                            blob_path = os.path.join(self.blob_dir, prefix, digest)
+                            freed += os.path.getsize(blob_path)
+                            os.remove(blob_path)
+            # Trimmed histories cannot be expressed as appended records
+            self.compact()
+        return freed
+
+    # ----------------------------------------------------------- restores
+
+    def _write_file(self, path: str, digest: Optional[str]):
+        if digest is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self.read_blob(digest))
+        self.snapshot_file(path)
+
+    def restore_task(self, task_id: int) -> bool:
+        """Put every file a task touched back to its state before the task"""
+        manifest = self.load_manifest(task_id)
+        if not manifest:
+            return False
+        with self._lock:
+            for path, states in manifest["files"].items():
+                versions = self.index["history"].get(path)
+                current = self.snapshot_file(path)
+                if current is not None and (not versions or versions[-1][1] != current):
+                    self._add_version(path, None, current)
+                self._write_file(path, states["before"])
+                if states["before"] is not None:
+                    self._add_version(path, task_id, states["before"])
+        return True
+
+    def restore_file(self, path: str, steps: int = 1) -> bool:
+        """Roll a file back by the given number of versions"""
+        with self._lock:
+            key = self._key(path)
+            current = self.snapshot_file(path)
+            # Keep the version being replaced so the undo itself can be undone
+            versions = self.index["history"].get(key)
+            if current is not None and (not versions or versions[-1][1] != current):
+                self._add_version(key, None, current)
+            versions = self.history(path)
+
+            # Walk back over distinct versions, skipping the one on disk
+            distinct = []
+            for _, digest, _ in reversed(versions):
+                if digest != current and digest not in distinct:
+                    distinct.append(digest)
+            if len(distinct) < steps:
+                return False
+
+            target = distinct[steps - 1]
+            self._write_file(path, target)
+            self._add_version(key, None, target)
+            return True
+
+    # -------------------------------------------------------------- diffs
+
+    def _text(self, digest: Optional[str]) -> List[str]:
+        if digest is None:
+            return []
+        return self.read_blob(digest).decode("utf-8", errors="replace").splitlines(keepends=True)
+
+    def diff_file(self, path: str) -> str:
+        """Current content against the previous stored version"""
+        current = self.snapshot_file(path)
+        previous = next((d for _, d, _ in reversed(self.history(path)) if d != current), None)
+        if previous is None:
+            return "No previous version found."
+        diff = unified_diff(self._text(previous), self._text(current), fromfile="previous", tofile="current")
+        return "".join(diff) or "No differences."
+
+    def diff_tasks(self, task_a: int, task_b: int) -> str:
+        """Files as left by task_a against files as left by task_b"""
+        manifest_a, manifest_b = self.load_manifest(task_a), self.load_manifest(task_b)
+        if not manifest_a or not manifest_b:
+            return "Snapshot not found for one of the tasks."
+
+        files_a, files_b = manifest_a["files"], manifest_b["files"]
+        output = []
+        for path in sorted(set(files_a) | set(files_b)):
+            before = files_a.get(path, {}).get("after")
+            after = files_b.get(path, {}).get("after")
+            if before == after:
+                continue
+            output.extend(unified_diff(
+                self._text(before), self._text(after),
+                fromfile=f"{path}@{task_a}", tofile=f"{path}@{task_b}"
+            ))
+        return "".join(output) or "No differences."
+
+
+# Global instance
+snapshot_store = SnapshotStore()
@@ -0,0 +1,342 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from core.async_io import get_store
+from core.role_manager import settings
+from memory.models import Task
+from memory.wal import WriteAheadLog
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; only one process can use the store there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "logs/memory.json"
+WAL_FILE = "logs/memory.wal"
+LOCK_FILE = "logs/memory.lock"
+
+
+class ConflictError(Exception):
+    """A task changed (or was created) since the caller read it"""
+
+
+class TaskStore:
+    """
+    Task records kept in memory and persisted as snapshot + write-ahead log.
+
+    logs/memory.json is a compact JSON list of tasks (the snapshot);
+    every add/update since it was written is a checksummed record in
+    logs/memory.wal. Startup loads the snapshot and replays only the log,
+    and every compact_every records the snapshot is rewritten and the log
+    emptied, so no mutation ever rewrites the whole store in place.
+
+    Every task carries a version. update() is a compare-and-swap against
+    the version the caller read, and modify() retries a read-change-write
+    until it lands. Mutations hold an flock on logs/memory.lock and first
+    apply whatever other processes appended to the log, so several bot
+    processes can share the store.
+
+    Tasks are held as slotted Task records (memory/models.py) and behave
+    like dicts; tasks still in the older indented, full-text format are
+    converted as they are loaded.
+    """
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_FILE, wal_path: str = WAL_FILE,
+                 lock_path: str = LOCK_FILE, compact_every: Optional[int] = None):
+        self.snapshot_path = snapshot_path
+        self.lock_path = lock_path
+        self.compact_every = compact_every or settings.get("io", {}).get("wal_compact_every", 1000)
+        self._store = get_store("tasks")
+        self.wal = WriteAheadLog(wal_path, fsync=self._store.fsync)
+        self.lock = threading.RLock()
+        self._tasks: Optional[List[Task]] = None
+        self._positions: Dict[Any, int] = {}
+        self.generation = -1  # Bumped whenever positions, and so query cursors, are rebuilt
+        self._reset_indexes()
+        self._max_id = 0
+        self._snapshot_stat = None
+        self._lock_file = None
+        self._lock_pid = None
+        self._lock_depth = 0
+
+    # ------------------------------------------------------------ loading
+
+    def _stat_snapshot(self):
+        try:
+            stat = os.stat(self.snapshot_path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        tasks = []
+        if os.path.exists(self.snapshot_path) and os.path.getsize(self.snapshot_path):
+            try:
+                with open(self.snapshot_path) as f:
+                    tasks = json.load(f)
+            except ValueError as e:
+                # Keep the damaged file for inspection; the log may still hold recent tasks
+                logger.error(f"Task snapshot {self.snapshot_path} is corrupt, starting empty: {e}")
+                os.replace(self.snapshot_path, self.snapshot_path + ".corrupt")
+
+        self._snapshot_stat = self._stat_snapshot()
+        self._tasks = []
+        self._positions = {}
+        self._reset_indexes()
+        self._max_id = 0
+        for task in tasks:
+            self._put(Task.from_json(task))
+        for record in self.wal.replay():
+            self._apply(record)
+
+    def _refresh(self):
+        """Catch up with changes other processes made to the snapshot or log"""
+        if self._tasks is None or self._stat_snapshot() != self._snapshot_stat:
+            self._load()
+            return
+        for record in self.wal.read_new():
+            self._apply(record)
+
+    @contextmanager
+    def _locked(self, shared: bool = False):
+        """Thread lock plus (outermost only) an flock, then catch up"""
+        with self.lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                # flock is per open file, so a forked child needs its own
+                if self._lock_file is None or self._lock_pid != os.getpid():
+                    os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+                    self._lock_file = open(self.lock_path, "a")
+                    self._lock_pid = os.getpid()
+                fcntl.flock(self._lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    self._refresh()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    # -------------------------------------------------------------- state
+
+    def _reset_indexes(self):
+        # Positions in _tasks, which only ever grows, so per-user lists stay sorted
+        self._by_user: Dict[Any, List[int]] = {}
+        self._by_status: Dict[Any, set] = {}
+        self._counts: Dict[Any, Counter] = {}
+        self.generation += 1
+
+    def _put(self, task: Task):
+        task_id = task.get("id")
+        if isinstance(task_id, int):
+            self._max_id = max(self._max_id, task_id)
+        position = self._positions.get(task_id)
+        if position is None:
+            position = self._positions[task_id] = len(self._tasks)
+            self._tasks.append(task)
+            self._by_user.setdefault(task.get("user_id"), []).append(position)
+        else:
+            old = self._tasks[position]
+            self._by_status[old.get("status")].discard(position)
+            self._counts[old.get("user_id")][old.get("status")] -= 1
+            self._tasks[position] = task
+        self._by_status.setdefault(task.get("status"), set()).add(position)
+        self._counts.setdefault(task.get("user_id"), Counter())[task.get("status")] += 1
+
+    def _apply(self, record: Dict[str, Any]):
+        # add and update are both upserts, which keeps replay idempotent
+        if record["op"] in ("add", "update"):
+            self._put(Task.from_json(record["task"]))
+        elif record["op"] == "reserve":
+            self._max_id = max(self._max_id, record["id"])
+
+    def _log(self, record: Dict[str, Any]):
+        count = self.wal.append(record)
+        self._apply(copy.deepcopy(record))
+        if count >= self.compact_every:
+            self.compact()
+
+    # ---------------------------------------------------------- mutations
+
+    def new_id(self) -> int:
+        """A task ID no process has used: the current time, bumped past the newest"""
+        with self._locked():
+            task_id = max(int(time.time()), self._max_id + 1)
+            self._log({"op": "reserve", "id": task_id})
+            return task_id
+
+    def add(self, task: Dict[str, Any]):
+        with self._locked():
+            if task.get("id") in self._positions:
+                raise ConflictError(f"Task {task.get('id')} already exists")
+            self._log({"op": "add", "task": Task(task, version=1).to_json()})
+        task["version"] = 1
+
+    def update(self, task: Dict[str, Any]):
+        """Save task if it is still at the version it was read at; bumps the version"""
+        with self._locked():
+            position = self._positions.get(task.get("id"))
+            if position is None:
+                raise ConflictError(f"Task {task.get('id')} does not exist")
+            current = self._tasks[position].get("version", 0)
+            if task.get("version", 0) != current:
+                raise ConflictError(f"Task {task['id']} is at version {current}, "
+                                    f"not {task.get('version', 0)}")
+            self._log({"op": "update", "task": Task(task, version=current + 1).to_json()})
+        task["version"] = current + 1
+
+    def modify(self, task_id, change: Callable[[Dict[str, Any]], Any],
+               retries: int = 5) -> Optional[Dict[str, Any]]:
+        """
+        Apply change to a fresh copy of the task and save it, retrying on
+        conflicts. change may return False to leave the task as it is.
+        Returns the saved task, or None if it does not exist.
+        """
+        for _ in range(retries):
+            task = self.get(task_id)
+            if task is None:
+                return None
+            if change(task) is False:
+                return task
+            try:
+                self.update(task)
+                return task
+            except ConflictError:
+                continue
+        raise ConflictError(f"Task {task_id} kept changing; gave up after {retries} attempts")
+
+    def replace_all(self, tasks: List[Dict[str, Any]]):
+        """Swap in a whole new task list (e.g. clearing memory) via a snapshot"""
+        with self._locked():
+            previous_max = self._max_id
+            self._tasks = []
+            self._positions = {}
+            self._reset_indexes()
+            self._max_id = 0
+            for task in tasks:
+                self._put(Task.from_json(task))
+            self.compact()
+            # IDs handed out before are never reused
+            if previous_max > self._max_id:
+                self._log({"op": "reserve", "id": previous_max})
+
+    def purge(self, should_remove: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
+        """Drop every task should_remove selects, atomically; returns the dropped tasks"""
+        with self._locked():
+            removed = [task for task in self._tasks if should_remove(task)]
+            if removed:
+                self.replace_all([task for task in self._tasks if not should_remove(task)])
+            return removed
+
+    def compact(self):
+        """Write the snapshot, then drop the log records it now covers"""
+        with self._locked():
+            tasks = [task.to_json() for task in self._tasks]
+            self._store.write_sync(self.snapshot_path, json.dumps(tasks, separators=(",", ":")))
+            self._snapshot_stat = self._stat_snapshot()
+            self.wal.reset()
+
+    # ------------------------------------------------------------ queries
+
+    def get(self, task_id) -> Optional[Task]:
+        """A copy of the task, so callers change it only through update()"""
+        with self._locked(shared=True):
+            position = self._positions.get(task_id)
+            return self._tasks[position].copy() if position is not None else None
+
+    def all(self) -> List[Task]:
+        """All tasks, oldest first; treat them as read-only"""
+        with self._locked(shared=True):
+            return list(self._tasks)
+
+    def query(self, user_id=None, status=None, since: Optional[float] = None, until: Optional[float] = None,
+              limit: Optional[int] = 10, cursor: Optional[int] = None, offset: int = 0,
+              newest_first: bool = True) -> Dict[str, Any]:
+        """
+        Tasks matching every given filter, one page at a time.
+
+        user_id and status are answered from indexes; the time range
+        (on "timestamp") is checked only on those candidates. Pass the
+        returned next_cursor back to get the following page; offset skips
+        matches instead (page N = offset (N - 1) * limit). total counts the
+        user/status matches before the time range is applied. Cursors are
+        store positions, valid only while generation stays the same (purge
+        and replace_all rebuild the positions).
+        """
+        with self._locked(shared=True):
+            members = None
+            if user_id is not None:
+                positions = self._by_user.get(user_id, [])
+                if status is not None:
+                    # Checked lazily while walking the user's tasks; the counter gives the total
+                    members = self._by_status.get(status, set())
+                    total = self._counts.get(user_id, Counter())[status]
+                else:
+                    total = len(positions)
+            elif status is not None:
+                positions = sorted(self._by_status.get(status, ()))
+                total = len(positions)
+            else:
+                positions = range(len(self._tasks))
+                total = len(positions)
+
+            if cursor is not None:
+                if newest_first:
+                    positions = positions[:bisect_left(positions, cursor)]
+                else:
+                    positions = positions[bisect_left(positions, cursor + 1):]
+
+            if limit == 0:
+                # An empty page; the next one starts where this one would have
+                return {"tasks": [], "next_cursor": cursor, "total": total, "generation": self.generation}
+
+            tasks, next_cursor, skipped, last_position = [], None, 0, None
+            for position in (reversed(positions) if newest_first else positions):
+                if members is not None and position not in members:
+                    continue
+                task = self._tasks[position]
+                timestamp = task.get("timestamp", 0)
+                if (since is not None and timestamp < since) or (until is not None and timestamp > until):
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if limit is not None and len(tasks) == limit:
+                    next_cursor = last_position
+                    break
+                tasks.append(task.copy())
+                last_position = position
+
+            return {"tasks": tasks, "next_cursor": next_cursor, "total": total, "generation": self.generation}
+
+    def counts(self, user_id=None) -> Dict[Any, int]:
+        """Number of tasks per status, for one user or everyone"""
+        with self._locked(shared=True):
+            if user_id is not None:
+                counter = self._counts.get(user_id, Counter())
+            else:
+                counter = sum(self._counts.values(), Counter())
+            return {status: n for status, n in counter.items() if n > 0}
+
+
+_task_locks: Dict[Any, asyncio.Lock] = {}
+
+
+def task_lock(task_id) -> asyncio.Lock:
+    """Lock serializing this process's handlers that act on one task"""
+    return _task_locks.setdefault(task_id, asyncio.Lock())
+
+
+# Global instance
+task_store = TaskStore()
@@ -0,0 +1,104 @@
+import os
+import json
+import zlib
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def write_snapshot(path: str, text: str, fsync: bool = True):
+    """Atomically replace path with text, durable before the WAL is reset"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if fsync:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class WriteAheadLog:
+    """
+    Append-only log of JSON records, one per line, each prefixed by the
+    CRC32 of its payload.
+
+    Owners apply a mutation only after append() returns, periodically
+    write a full snapshot and reset() the log, and on startup replay()
+    the records written since the last snapshot. A record torn by a
+    crash fails its checksum; replay stops there and cuts it off.
+    Records must be idempotent, since a crash between writing a snapshot
+    and resetting the log replays records the snapshot already contains.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self.records = 0
+        self.offset = 0  # Bytes of the log already applied by this process
+        self._file = None
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Durably log a record; returns the number logged since the last reset"""
+        payload = json.dumps(record, separators=(",", ":"))
+        line = f"{zlib.crc32(payload.encode('utf-8')):08x} {payload}\n"
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.offset = self._file.tell()
+        self.records += 1
+        return self.records
+
+    def replay(self) -> List[Dict[str, Any]]:
+        """Valid records since the last reset, truncating any torn tail"""
+        self.offset = 0
+        self.records = 0
+        records = self.read_new()
+        if os.path.exists(self.path) and self.offset < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(self.offset)
+        return records
+
+    def read_new(self) -> List[Dict[str, Any]]:
+        """Valid records appended (e.g. by another process) since offset"""
+        if not os.path.exists(self.path):
+            return []
+
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for raw in f:
+                try:
+                    crc, payload = raw.decode("utf-8").rstrip("\n").split(" ", 1)
+                    if not raw.endswith(b"\n") or int(crc, 16) != zlib.crc32(payload.encode("utf-8")):
+                        raise ValueError("checksum mismatch")
+                    records.append(json.loads(payload))
+                except ValueError as e:
+                    logger.warning(f"{self.path}: dropping log tail after offset {self.offset}: {e}")
+                    break
+                self.offset += len(raw)
+
+        self.records += len(records)
+        return records
+
+    def reset(self):
+        """Empty the log once its records are covered by a snapshot"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.path, "w"):
+            pass
+        self.records = 0
+        self.offset = 0
@@ -0,0 +1,125 @@
+import os
+import re
+import ast
+import json
+import hashlib
+from typing import Dict, List, Any, Optional
+
+TASK_DIR = "logs/tasks"
+
+# How much of a file a check depends on:
+#   content - any byte change re-runs it (e.g. formatting-sensitive linters)
+#   ast     - only semantic changes re-run it; line numbers are remapped otherwise.
+#             Checks always run on the whole file: bandit and the Pyrogram
+#             checks need module-wide context, so per-node hashes only
+#             serve to remap lines of reused findings
+#   imports - only changes to import statements re-run it
+#   plugin  - depends on other files of the plugin as well; always re-run
+SCOPES = ("content", "ast", "imports", "plugin")
+
+_LINE_PATTERNS = (re.compile(r"(?<=:)(\d+)(?=:)"), re.compile(r"(?<=line )(\d+)"))
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fingerprint(content: str, tree: Optional[ast.Module]) -> Dict[str, Any]:
+    """Content hash plus per-top-level-node semantic hashes of a file"""
+    state = {"sha": _hash(content), "nodes": [], "imports": None}
+    if tree is None:
+        return state
+
+    for node in tree.body:
+        start = min([d.lineno for d in getattr(node, "decorator_list", [])] + [node.lineno])
+        state["nodes"].append([start, node.end_lineno, _hash(ast.dump(node, include_attributes=False))])
+
+    imports = [
+        ast.dump(node, include_attributes=False) for node in ast.walk(tree)
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+    state["imports"] = _hash("\n".join(imports))
+    return state
+
+
+def is_reusable(scope: str, previous: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    """Whether a check with this scope can keep its cached result"""
+    if scope == "plugin":
+        return False
+    if previous["sha"] == current["sha"]:
+        return True
+    if not previous["nodes"] or not current["nodes"]:
+        return False
+    if scope == "imports":
+        return previous["imports"] == current["imports"]
+    if scope == "ast":
+        return [n[2] for n in previous["nodes"]] == [n[2] for n in current["nodes"]]
+    return False
+
+
+def remap_messages(messages: List[str], previous: Dict[str, Any], current: Dict[str, Any],
+                   old_path: str, new_path: str) -> List[str]:
+    """
+    Move line numbers in cached messages to where their node now starts.
+    Only valid when the node sequence is semantically unchanged.
+    """
+    shifts = [(old[0], new[0] - old[0]) for old, new in zip(previous["nodes"], current["nodes"])]
+
+    def shift_line(match):
+        line = int(match.group(1))
+        delta = 0
+        for start, node_delta in shifts:
+            if start > line:
+                break
+            delta = node_delta
+        return str(line + delta)
+
+    remapped = []
+    for message in messages:
+        if old_path != new_path:
+            message = message.replace(old_path, new_path)
+        if previous["sha"] != current["sha"]:
+            for pattern in _LINE_PATTERNS:
+                message = pattern.sub(shift_line, message, count=1)
+        remapped.append(message)
+    return remapped
+
+
+def cache_key(file_path: str) -> str:
+    """Path of a file inside its plugin, identical for its sandbox and plugins copies"""
+    rel_path = os.path.relpath(file_path) if os.path.isabs(file_path) else os.path.normpath(file_path)
+    parts = rel_path.split(os.sep)
+    if len(parts) > 2 and parts[0] in ("sandbox", "plugins"):
+        return "/".join(parts[2:])
+    return "/".join(parts)
+
+
+class CheckCache:
+    """Per-task record of the last checked version of each file and its results"""
+
+    def __init__(self, task_id: Optional[int]):
+        self.task_id = task_id
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if task_id is not None and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(TASK_DIR, str(self.task_id), "checks.json")
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(cache_key(file_path))
+
+    def put(self, file_path: str, state: Dict[str, Any]):
+        self.entries[cache_key(file_path)] = state
+
+    def save(self):
+        if self.task_id is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump({"task_id": self.task_id, "files": self.entries}, f)
@@ -1,13 +1,20 @@
 from pyrogram import filters
 from pyrogram.enums import ParseMode
-from core.role_manager import is_owner, is_dev, access_mode, get_current_mode4
+from core.role_manager import is_owner, is_dev, access_mode, get_current_mode, settings, update_setting
 from modules.regression_checker import regression_checker
+from modules.file_watcher import file_watcher
+from modules.message_utils import paginate_text
+import asyncio
 import os
-from core.task_manager import diff_file, restore_file
-from memory.memory_manager import revert_task
+from core.task_manager import diff_file, diff_tasks, restore_file
+from memory.memory_manager import revert_task, task_lock
 import json
 import sys
 
+# /memory page cursors: (viewer, filters) -> (store generation, {page: cursor}), filled as pages are shown
+_memory_cursors = {}
+MAX_MEMORY_CURSORS = 256
+
 def register_commands(bot):
 
     @bot.on_message(filters.command("reload") & filters.private)
@@ -46,55 +53,109 @@ def register_commands(bot):
     @bot.on_message(filters.command("diff") & filters.private)
     async def diff_command(client, message):
         if len(message.command) < 2:
-            return await message.reply("Usage: /diff <file>")
-        file = message.command[1]
+            return await message.reply("Usage: /diff <file> | /diff <task_a> <task_b>")
+        args = message.command[1:]
         try:
-            result = diff_file(file)
-            await message.reply(f"```diff\n{result}```", parse_mode="markdown")
+            if len(args) >= 2 and args[0].isdigit() and args[1].isdigit():
+                result = diff_tasks(int(args[0]), int(args[1]))
+            else:
+                result = diff_file(args[0])
+            # Leave room for the code fence around each page
+            for page in paginate_text(result, limit=3900):
+                await message.reply(f"```diff\n{page}```", parse_mode=ParseMode.MARKDOWN)
         except Exception as e:
             await message.reply(f"Error: {e}")
 
     @bot.on_message(filters.command("undo") & filters.private)
     async def undo_command(client, message):
         if len(message.command) < 2:
-            return await message.reply("Usage: /undo <file|task ID>")
+            return await message.reply("Usage: /undo <file> [steps] | /undo <task ID>")
         arg = message.command[1]
         if arg.isdigit():
-            success, msg = revert_task(int(arg))
+            async with task_lock(int(arg)):
+                success, msg = await asyncio.to_thread(revert_task, int(arg))
         else:
-            success = restore_file(arg)
-            msg = "Restored." if success else "Backup not found."
+            steps = int(message.command[2]) if len(message.command) > 2 and message.command[2].isdigit() else 1
+            success = restore_file(arg, steps)
+            msg = f"Restored {steps} version(s) back." if success else "No earlier version found."
         await message.reply(msg)
 
     @bot.on_message(filters.command("review") & filters.private)
     async def review_command(client, message):
         if len(message.command) < 2:
-            return await message.reply("Usage: /review <file>")
+            return await message.reply("Usage: /review <file|plugin_dir>")
         path = message.command[1]
         if not os.path.exists(path):
             return await message.reply("File not found.")
-        with open(path, 'r') as f:
-            code = f.read()
-        from core.ai_engine import model
-        prompt = f"Review this Pyrogram bot module code and provide concise suggestions:\n{code}"
-        response = model.generate_content(prompt)
-        await message.reply(response.text)
+        from jarvis_engine import jarvis_engine
+        if os.path.isdir(path):
+            response = await asyncio.to_thread(jarvis_engine.review_plugin, path)
+        else:
+            with open(path, 'r') as f:
+                code = f.read()
+            response = await asyncio.to_thread(jarvis_engine.review_code, path, code)
+        for page in paginate_text(response):
+            await message.reply(page)
 
     @bot.on_message(filters.command("memory") & filters.private)
     async def memory_command(client, message):
         if not is_dev(message.from_user.id):
             return await message.reply("❌ Access denied.")
         
-        from memory.memory_manager import load_tasks
-        tasks = load_tasks()[-10:]  # Last 10 tasks
+        from memory.memory_manager import query_tasks, cursor_generation
+        
+        # /memory [page N] [user <id>] [status <s>], in any combination
+        args = message.command[1:]
+        query_filters = {}
+        page = 1
+        try:
+            for key, value in zip(args[::2], args[1::2]):
+                if key == "page":
+                    page = max(1, int(value))
+                elif key == "user":
+                    query_filters["user_id"] = int(value)
+                elif key == "status":
+                    query_filters["status"] = value
+                else:
+                    raise ValueError(key)
+            if len(args) % 2:
+                raise ValueError(args[-1])
+        except ValueError:
+            return await message.reply("Usage: /memory [page N] [user <id>] [status <s>]")
+        
+        page_size = 10
+        # Pages reached one by one resume from the previous page's cursor;
+        # a page jumped to directly is found by offset
+        # (purging or clearing tasks rebuilds positions, so older cursors are dropped)
+        key = (message.from_user.id, tuple(sorted(query_filters.items())))
+        generation = cursor_generation()
+        cached = _memory_cursors.get(key)
+        cursors = cached[1] if cached and cached[0] == generation else {}
+        result = None
+        if page in cursors:
+            result = query_tasks(limit=page_size, cursor=cursors[page], **query_filters)
+            if result["generation"] != generation:
+                result = None  # Rebuilt while querying; the cursor meant other tasks
+        if result is None:
+            result = query_tasks(limit=page_size, offset=(page - 1) * page_size, **query_filters)
+        tasks = result["tasks"]
+        
+        if result["next_cursor"] is not None:
+            if len(_memory_cursors) >= MAX_MEMORY_CURSORS:
+                _memory_cursors.clear()
+            cached = _memory_cursors.get(key)
+            if not cached or cached[0] != result["generation"]:
+                cached = _memory_cursors[key] = (result["generation"], {})
+            cached[1][page + 1] = result["next_cursor"]
         
         if not tasks:
-            await message.reply("No tasks in memory.")
+            await message.reply("No tasks in memory." if page == 1 else "No tasks on this page.")
             return
         
-        response = "📋 Recent Tasks:\n"
+        pages = max(1, -(-result["total"] // page_size))
+        response = f"📋 Recent Tasks (page {page}/{pages}):\n"
         for task in tasks:
-            response += f"• Task {task['id']}: {task.get('status', 'unknown')}\n"
+            response += f"• Task {task['id']}: {task.get('status', 'unknown')} (user {task.get('user_id')})\n"
         
         await message.reply(response)
 
@@ -103,11 +164,29 @@ def register_commands(bot):
         if not is_dev(message.from_user.id):
             return await message.reply("❌ Access denied.")
         
-        with open("logs/memory.json", "w") as f:
-            json.dump([], f)
+        from memory.memory_manager import save_tasks
+        save_tasks([])
         
         await message.reply("🧹 Memory cleared.")
 
+    @bot.on_message(filters.command("maintenance") & filters.private)
+    async def maintenance_command(client, message):
+        if not is_dev(message.from_user.id):
+            return await message.reply("❌ Access denied.")
+        
+        from memory.retention import retention_manager
+        await message.reply("🧹 Running maintenance...")
+        report = await asyncio.to_thread(retention_manager.run)
+        
+        await message.reply(
+            "✅ Maintenance done:\n"
+            f"• Tasks archived: {report['tasks_archived']}\n"
+            f"• Conversations trimmed: {report['conversations_trimmed']}\n"
+            f"• Activity logs rotated: {report['logs_rotated']}\n"
+            f"• Snapshot data freed: {report['snapshot_bytes_freed'] / 1024:.1f} KB\n"
+            f"• Total reclaimed: {report['bytes_reclaimed'] / 1024:.1f} KB"
+        )
+
     @bot.on_message(filters.command("plugins") & filters.private)
     async def plugins_command(client, message):
         if not is_dev(message.from_user.id):
@@ -118,7 +197,7 @@ def register_commands(bot):
             await message.reply("No plugins directory found.")
             return
         
-        plugins = [d for d in os.listdir(plugins_dir) if os.path.isdir(os.path.join(plugins_dir, d))]
+        plugins = [d for d in os.listdir(plugins_dir) if os.path.isdir(os.path.join(plugins_dir, d)) and not d.startswith(".")]
         
         if not plugins:
             await message.reply("No plugins found.")
@@ -149,22 +228,13 @@ def register_commands(bot):
         if not os.path.exists(handler_path):
             return await message.reply("❌ Plugin handler not found.")
         
-        # Try to load the plugin
-        try:
-            import importlib.util
-            spec = importlib.util.spec_from_file_location(plugin_name, handler_path)
-            plugin_module = importlib.util.module_from_spec(spec)
-            plugin_module.bot = bot
-            spec.loader.exec_module(plugin_module)
-            
-            # If plugin has register_handlers function, call it
-            if hasattr(plugin_module, 'register_handlers'):
-                plugin_module.register_handlers(client, bot)
-            
+        # Through the loader, so its handlers are tracked and replaced on reload
+        from modules.plugin_loader import load_plugin
+        if load_plugin(client, plugin_name):
             await message.reply(f"✅ Plugin '{plugin_name}' enabled successfully.")
-            
-        except Exception as e:
-            await message.reply(f"❌ Error enabling plugin: {e}")
+        else:
+            await message.reply(f"❌ Error enabling plugin '{plugin_name}': it is disabled in the config or "
+                                f"failed to load (see the log).")
 
     @bot.on_message(filters.command("disable") & filters.private)
     async def disable_plugin_command(client, message):
@@ -194,13 +264,7 @@ def register_commands(bot):
             return await message.reply("Usage: /mode <auto|manual>")
         
         try:
-            with open("config/settings.json", "r") as f:
-                settings = json.load(f)
-            
-            settings["mode"] = mode
-            
-            with open("config/settings.json", "w") as f:
-                json.dump(settings, f, indent=2)
+            update_setting("mode", mode)
             
             await message.reply(f"✅ Mode updated to: `{mode}`", parse_mode="markdown")
         
@@ -212,37 +276,28 @@ def register_commands(bot):
         if not is_dev(message.from_user.id):
             return await message.reply("❌ Access denied.")
         
-        def generate_tree(directory, prefix="", max_depth=3, current_depth=0):
-            if current_depth > max_depth:
-                return ""
-            
-            items = []
-            try:
-                entries = sorted(os.listdir(directory))
-                for i, entry in enumerate(entries):
-                    if entry.startswith('.'):
-                        continue
-                    
-                    path = os.path.join(directory, entry)
-                    is_last = i == len(entries) - 1
-                    current_prefix = "└── " if is_last else "├── "
-                    items.append(f"{prefix}{current_prefix}{entry}")
-                    
-                    if os.path.isdir(path) and current_depth < max_depth:
-                        next_prefix = prefix + ("    " if is_last else "│   ")
-                        items.append(generate_tree(path, next_prefix, max_depth, current_depth + 1))
-            except PermissionError:
-                pass
-            
-            return "\n".join(filter(None, items))
+        from modules.tree_index import tree_index
         
-        tree_output = f"📁 **Project Structure:**\n```\n{generate_tree('.')}\n```"
+        # /tree [path] [depth]
+        path, depth = ".", 3
+        for arg in message.command[1:]:
+            if arg.isdigit():
+                depth = int(arg)
+            else:
+                path = arg
         
-        # Split message if too long
-        if len(tree_output) > 4000:
-            tree_output = tree_output[:4000] + "...\n```\n(truncated)"
+        if os.path.isabs(path) or os.path.normpath(path).startswith(".."):
+            return await message.reply("❌ Path must be inside the project.")
         
-        await message.reply(tree_output, parse_mode="markdown")
+        try:
+            lines = await asyncio.to_thread(tree_index.render, path, depth)
+        except FileNotFoundError:
+            return await message.reply(f"❌ Directory not found: {path}")
+        
+        # Leave room for the code fence around each page
+        for i, page in enumerate(paginate_text("\n".join(lines), limit=3900)):
+            header = "📁 **Project Structure:**\n" if i == 0 else ""
+            await message.reply(f"{header}```\n{page}\n```", parse_mode=ParseMode.MARKDOWN)
 
     @bot.on_message(filters.command("adddev") & filters.private)
     async def add_dev_command(client, message):
@@ -255,14 +310,8 @@ def register_commands(bot):
         try:
             user_id = int(message.command[1])
             
-            with open("config/settings.json", "r") as f:
-                settings = json.load(f)
-            
             if user_id not in settings["devs"]:
-                settings["devs"].append(user_id)
-                
-                with open("config/settings.json", "w") as f:
-                    json.dump(settings, f, indent=2)
+                update_setting("devs", settings["devs"] + [user_id])
                 
                 await message.reply(f"✅ Added user {user_id} as developer.")
             else:
@@ -282,14 +331,8 @@ def register_commands(bot):
         try:
             user_id = int(message.command[1])
             
-            with open("config/settings.json", "r") as f:
-                settings = json.load(f)
-            
             if user_id in settings["devs"]:
-                settings["devs"].remove(user_id)
-                
-                with open("config/settings.json", "w") as f:
-                    json.dump(settings, f, indent=2)
+                update_setting("devs", [dev for dev in settings["devs"] if dev != user_id])
                 
                 await message.reply(f"✅ Removed user {user_id} from developers.")
             else:
@@ -313,13 +356,7 @@ def register_commands(bot):
             await message.reply("Usage: /access <dev|public>")
             return
         
-        with open("config/settings.json", "r") as f:
-            settings = json.load(f)
-        
-        settings["access"] = mode
-        
-        with open("config/settings.json", "w") as f:
-            json.dump(settings, f, indent=2)
+        update_setting("access", mode)
         
         await message.reply(f"✅ Access mode set to: {mode}")
 
@@ -336,20 +373,23 @@ def register_commands(bot):
 /start - Welcome message
 /help - Show this help
 /info - Bot status
-/memory - Show recent AI tasks
-/diff <file> - Show file changes
-/undo <file> - Restore file backup
+/memory [page N] [user <id>] [status <s>] - Show recent AI tasks
+/diff <file> - Show changes since the previous version
+/diff <task_a> <task_b> - Compare two task versions
+/undo <file> [steps] - Roll a file back N versions
+/undo <task_id> - Revert everything a task changed
 /clearmemory - Clear task memory
+/maintenance - Archive old tasks, trim logs, report space reclaimed
 /plugins - List all plugins
 /enable <plugin> - Enable plugin
 /disable <plugin> - Disable plugin
 /mode <auto/manual> - Set automation mode
-/tree - Show project structure
+/tree [path] [depth] - Show project structure
 /access dev/public - Set access mode
 /adddev <id> - Add developer
 /removedev <id> - Remove developer
 /clearhistory - Clear chat memory
-/review <file> - AI code review
+/review <file|plugin_dir> - AI code review
             """
         else:
             help_text = """
@@ -363,7 +403,7 @@ def register_commands(bot):
 
     @bot.on_message(filters.command("info") & filters.private)
     async def info_command(client, message):
-        from memory.memory_manager import get_pending_tasks
+        from memory.memory_manager import task_counts
 
         user_id = message.from_user.id
         role = "Owner" if is_owner(user_id) else "Developer" if is_dev(user_id) else "Public"
@@ -376,14 +416,14 @@ def register_commands(bot):
 👤 Your Role: {role}
 🔒 Access Mode: {mode}
 🔌 Plugins: {plugin_count}
-📁 Sandbox Tasks: {len(get_pending_tasks(user_id))}
+📁 Sandbox Tasks: {task_counts(user_id).get("sandboxed", 0)}
         """
         await message.reply(info_text)
 
     @bot.on_message(filters.command("clearhistory") & filters.private)
     async def clear_history_command(client, message):
-        from memory.conversation_manager import save_chat_memory
-        save_chat_memory(message.from_user.id, [])
+        from memory.conversation_manager import clear_chat_memory
+        clear_chat_memory(message.from_user.id)
         await message.reply("✅ Chat history cleared!")
 
     @bot.on_message(filters.command("check") & filters.private)
@@ -394,8 +434,14 @@ def register_commands(bot):
         
         # Get file path from command
         parts = message.text.split()
+        deep = "--deep" in parts
+        parts = [part for part in parts if part != "--deep"]
         if len(parts) < 2:
-            await message.reply("Usage: /check <file_path>")
+            await message.reply("Usage: /check <file_path> [--deep]")
+            return
+        
+        if deep and not is_owner(message.from_user.id):
+            await message.reply("❌ Only the owner can run deep checks")
             return
         
         file_path = parts[1]
@@ -403,9 +449,18 @@ def register_commands(bot):
             await message.reply("❌ File not found")
             return
         
-        result = regression_checker.comprehensive_check(file_path)
+        if deep:
+            # pylint on top of the fast checks; slow, so never cached or run in the background
+            result = await asyncio.to_thread(regression_checker.comprehensive_check, file_path, True)
+            cached = False
+        else:
+            # Files under sandbox/ and plugins/ are usually checked in the background already
+            result = file_watcher.latest(file_path)
+            cached = result is not None
+            if not cached:
+                result = await asyncio.to_thread(file_watcher.check_now, file_path)
         
-        report = f"📊 **Quality Report**\n"
+        report = f"📊 **Quality Report**{' (auto-checked)' if cached else ''}\n"
         report += f"Score: {result.score}/100\n"
         report += f"Status: {'✅ PASSED' if result.passed else '❌ FAILED'}\n\n"
         
@@ -421,6 +476,17 @@ def register_commands(bot):
         
         await message.reply(report)
     
+    def format_fix_report(report):
+        changed = [entry for entry in report if entry["changed"]]
+        if not changed:
+            return None
+        text = f"🛠 Auto-fix applied to {len(changed)} file(s):\n"
+        for entry in changed:
+            text += f"• {entry['path']}: {entry['before']} → {entry['after']}/100\n"
+        if len(changed) < len(report):
+            text += f"\n{len(report) - len(changed)} file(s) needed no changes."
+        return text
+    
     @bot.on_message(filters.command("autofix") & filters.private)
     async def auto_fix_code(client, message):
         if not is_dev(message.from_user.id):
@@ -429,43 +495,41 @@ def register_commands(bot):
         
         parts = message.text.split()
         if len(parts) < 2:
-            await message.reply("Usage: /autofix <file_path>")
+            await message.reply("Usage: /autofix <file_path> [file_path ...]")
             return
         
-        file_path = parts[1]
-        if not os.path.exists(file_path):
-            await message.reply("❌ File not found")
+        file_paths = parts[1:]
+        missing = [path for path in file_paths if not os.path.exists(path)]
+        if missing:
+            await message.reply(f"❌ File not found: {', '.join(missing)}")
             return
         
-        if regression_checker.auto_fix(file_path):
-            await message.reply("✅ Auto-fix applied! Run /check to verify.")
-        else:
-            await message.reply("❌ Auto-fix failed or no fixes available")
+        report = await asyncio.to_thread(file_watcher.auto_fix, file_paths)
+        await message.reply(format_fix_report(report) or "❌ Auto-fix failed or no fixes available")
 
-        @bot.on_message(filters.regex(r"(?i)^fix it$") & filters.private)
-        async def handle_fix_it(client, message):
-            from modules.regression_checker import regression_checker
-            from memory.memory_manager import get_pending_tasks
-    
-            tasks = get_pending_tasks(message.from_user.id)
-            if not tasks:
-                return await message.reply("⚠️ No recent task found to fix.")
-    
-            latest = tasks[-1]
-            errors = latest.get("errors", [])
-    
-            if not errors:
-                return await message.reply("✅ No fixable errors found in last task.")
-    
-            fixed_files = []
-            for error in errors:
-                file_path = error.get("file")
-                if file_path and regression_checker.auto_fix(file_path):
-                    fixed_files.append(file_path)
-    
-            if fixed_files:
-                await message.reply("🛠 Auto-fix applied to:\n" + "\n".join(f"• {f}" for f in fixed_files))
-            else:
-                await message.reply("❌ Auto-fix failed or not applicable.")
+    async def fix_latest_task(message):
+        from memory.memory_manager import get_pending_tasks
+
+        tasks = get_pending_tasks(message.from_user.id)
+        if not tasks:
+            return await message.reply("⚠️ No recent task found to fix.")
+
+        latest = tasks[-1]
+        if not latest.get("errors"):
+            return await message.reply("✅ No fixable errors found in last task.")
+
+        # Fix every file of the task in one batch, not just the ones named in errors
+        file_paths = latest.get("files") or [error["file"] for error in latest["errors"] if error.get("file")]
+        report = await asyncio.to_thread(file_watcher.auto_fix, file_paths)
+        await message.reply(format_fix_report(report) or "❌ Auto-fix failed or not applicable.")
+
+    # Group -1 runs before main.py's catch-all text handler (group 0), which
+    # would otherwise take the message; stop there so it is not dispatched twice
+    @bot.on_message(filters.regex(r"(?i)^fix it$") & filters.private, group=-1)
+    async def handle_fix_it(client, message):
+        from memory.access_control import has_access
+        if has_access(message.from_user.id):  # Others get main.py's access reply
+            await fix_latest_task(message)
+            message.stop_propagation()
 
             
@@ -1,7 +1,6 @@
 import re
 import os
-import shutil
-from difflib import unified_diff
+from memory.snapshot_store import snapshot_store
 
 def clean_code_blocks(code: str) -> str:
     """Clean markdown code blocks from AI responses"""
@@ -13,48 +12,37 @@ def clean_code_blocks(code: str) -> str:
         code = code[:-3]
     return code.strip()
 
+def clean_json_response(response: str) -> str:
+    """Extract the JSON object from an AI response"""
+    response = clean_code_blocks(response)
+    start_idx = response.find('{')
+    end_idx = response.rfind('}')
+    if start_idx != -1 and end_idx != -1:
+        return response[start_idx:end_idx+1]
+    return response
+
 def backup_file(file_path: str) -> bool:
-    """Create backup of file"""
+    """Snapshot file into the content-addressed store"""
     try:
-        if os.path.exists(file_path):
-            shutil.copy(file_path, file_path + ".bak")
-            return True
-        return False
+        return snapshot_store.snapshot_file(file_path) is not None
     except Exception as e:
         print(f"Error backing up file: {e}")
         return False
 
-def restore_file(file_path: str) -> bool:
-    """Restore file from backup"""
+def restore_file(file_path: str, steps: int = 1) -> bool:
+    """Restore file to the version steps snapshots back"""
     try:
-        backup_path = file_path + ".bak"
-        if os.path.exists(backup_path):
-            shutil.copy(backup_path, file_path)
-            return True
-        return False
+        return snapshot_store.restore_file(file_path, steps)
     except Exception as e:
         print(f"Error restoring file: {e}")
         return False
 
 def diff_file(file_path: str) -> str:
-    """Compare file with its backup"""
+    """Compare file with its previous snapshot"""
     try:
-        backup_path = file_path + ".bak"
-        if not os.path.exists(backup_path):
-            return "No backup found."
-        
         if not os.path.exists(file_path):
             return "Original file not found."
-            
-        with open(file_path, 'r') as f1, open(backup_path, 'r') as f2:
-            diff = list(unified_diff(
-                f2.readlines(), 
-                f1.readlines(), 
-                fromfile="original", 
-                tofile="current"
-            ))
-        
-        return "".join(diff) or "No differences."
+        return snapshot_store.diff_file(file_path)
     except Exception as e:
         return f"Error comparing files: {e}"
 
@@ -78,3 +66,93 @@ def write_file(file_path: str, content: str) -> bool:
     except Exception as e:
         print(f"Error writing file: {e}")
         return False
+
+class PatchError(ValueError):
+    """Raised when a patch does not apply to the current file content"""
+
+def _parse_hunks(diff: str) -> list:
+    """Split a unified diff into (hint_line, old_lines, new_lines) hunks"""
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        if line.startswith("@@"):
+            match = re.match(r"@@ -(\d+)", line)
+            current = (int(match.group(1)) if match else 0, [], [])
+            hunks.append(current)
+        elif current is None or line.startswith(("---", "+++", "\\")):
+            continue
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+        else:
+            # Context line; models often drop the leading space on blank lines
+            text = line[1:] if line.startswith(" ") else line
+            current[1].append(text)
+            current[2].append(text)
+    return hunks
+
+def _find_block(lines: list, block: list, hint: int, start: int) -> int:
+    """Locate block in lines at or after start, preferring the position nearest hint"""
+    if not block:
+        return max(start, min(hint, len(lines)))
+
+    for normalize in (lambda s: s, lambda s: s.rstrip()):
+        target = [normalize(l) for l in block]
+        candidates = [
+            i for i in range(start, len(lines) - len(block) + 1)
+            if [normalize(l) for l in lines[i:i + len(block)]] == target
+        ]
+        if candidates:
+            return min(candidates, key=lambda i: abs(i - hint))
+    return -1
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    """Apply a unified diff, tolerating wrong hunk line numbers"""
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        raise PatchError("No hunks found in patch")
+
+    lines = original.splitlines()
+    position = 0
+    for number, (hint, old, new) in enumerate(hunks, 1):
+        index = _find_block(lines, old, max(hint - 1, 0), position)
+        if index == -1:
+            raise PatchError(f"Hunk {number} does not match the current file")
+        lines[index:index + len(old)] = new
+        position = index + len(new)
+
+    result = "\n".join(lines)
+    return result + "\n" if original.endswith("\n") or not original else result
+
+def replace_symbol(source: str, name: str, new_code: str) -> str:
+    """Replace the function or class called name (dotted for nesting) with new_code"""
+    import ast
+    from textwrap import dedent, indent
+
+    tree = ast.parse(source)
+    path = name.split(".")
+    matches = [
+        node for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.name == path[-1]
+    ]
+    if len(path) > 1:
+        parents = {
+            child: parent for parent in ast.walk(tree) for child in ast.iter_child_nodes(parent)
+        }
+        matches = [node for node in matches if getattr(parents.get(node), "name", None) == path[-2]]
+
+    if not matches:
+        raise PatchError(f"Symbol '{name}' not found")
+    if len(matches) > 1:
+        raise PatchError(f"Symbol '{name}' is ambiguous; use Parent.{path[-1]}")
+
+    node = matches[0]
+    # Keep the original decorators unless the replacement brings its own
+    if new_code.lstrip().startswith("@"):
+        start = min([d.lineno for d in node.decorator_list] + [node.lineno]) - 1
+    else:
+        start = node.lineno - 1
+    lines = source.splitlines(keepends=True)
+    replacement = indent(dedent(new_code).strip("\n") + "\n", " " * node.col_offset)
+    return "".join(lines[:start]) + replacement + "".join(lines[node.end_lineno:])
@@ -0,0 +1,327 @@
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+from typing import Dict, List, Any, Optional
+from core.role_manager import settings
+from modules.regression_checker import regression_checker, CheckResult
+from modules.tree_index import tree_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    "enabled": True,
+    "paths": ["sandbox", "plugins"],
+    "debounce_ms": 500,
+    "poll_interval": 2.0,
+}
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")
+
+
+def _normalize(path: str) -> str:
+    """Key for a file: its path relative to the project root"""
+    return os.path.relpath(os.path.abspath(path))
+
+
+def _is_watched_file(name: str) -> bool:
+    return name.endswith(".py") and not name.startswith(".")
+
+
+def _is_watched_dir(name: str) -> bool:
+    # Skips __pycache__ and integration staging/backup dirs (.staging-*, .old-*)
+    return not name.startswith(".") and name != "__pycache__"
+
+
+class _Inotify:
+    """Recursive inotify watches over a few directory trees, via ctypes"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._rm_watch = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths: Dict[int, str] = {}
+
+    def watch_tree(self, root: str) -> List[str]:
+        """Watch root and every directory below it; returns the .py files found"""
+        found = []
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if _is_watched_dir(d)]
+            wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                logger.warning(f"Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self.paths[wd] = directory
+            found.extend(os.path.join(directory, name) for name in files if _is_watched_file(name))
+        return found
+
+    def unwatch_tree(self, root: str):
+        prefix = root + os.sep
+        for wd, path in list(self.paths.items()):
+            if path == root or path.startswith(prefix):
+                self._rm_watch(self.fd, wd)
+                del self.paths[wd]
+
+    def read(self, timeout: float) -> List[tuple]:
+        """(directory, name, mask) events, waiting at most timeout seconds"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events, offset = [], 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            events.append((self.paths.get(wd), name, mask))
+        return events
+
+
+class FileWatcher:
+    """
+    Background regression checks for files edited in sandbox/ and plugins/.
+
+    Changes are picked up with inotify (or, where that is unavailable, by
+    polling mtimes), debounced so a burst of saves is checked once, and
+    checked on a worker thread with the previous run's state so unchanged
+    checks are reused. The latest result per file is kept in memory and
+    returned by latest() as long as the file has not changed since, which
+    lets /check answer without running anything. Directory changes also
+    invalidate the /tree index.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.debounce = self.config["debounce_ms"] / 1000
+        self._due: Dict[str, float] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self.backend = None
+
+    # ----------------------------------------------------------- results
+
+    def latest(self, file_path: str) -> Optional[CheckResult]:
+        """Cached result for the file's current content, or None if stale or never checked"""
+        key = _normalize(file_path)
+        with self._cond:
+            entry = self._results.get(key)
+        if entry is None or self._stat(key) != entry["stat"]:
+            return None
+        return entry["result"]
+
+    def check_now(self, file_path: str) -> CheckResult:
+        """Check a file immediately (reusing what is cached) and cache the result"""
+        key = _normalize(file_path)
+        with self._cond:
+            self._due.pop(key, None)
+        return self._check(key)
+
+    def auto_fix(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Auto-fix a batch of files and report each one's score before and
+        after. Only files the fixers actually changed are re-checked;
+        files that vanish meanwhile are left out of the report.
+        """
+        keys = [_normalize(path) for path in file_paths if os.path.isfile(path)]
+        before = {key: self.latest(key) or self.check_now(key) for key in keys}
+        keys = [key for key in keys if before[key] is not None]
+        changed = set(regression_checker.auto_fix_files(keys))
+        regression_checker.lint_batch(sorted(changed))
+        report = []
+        for key in keys:
+            after = self.check_now(key) if key in changed else before[key]
+            if after is None:
+                continue
+            report.append({"path": key, "changed": key in changed,
+                           "before": before[key].score, "after": after.score})
+        return report
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._due)
+
+    def _stat(self, key: str):
+        try:
+            stat = os.stat(key)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _check(self, key: str) -> Optional[CheckResult]:
+        stat = self._stat(key)
+        if stat is None:
+            self._forget(key)
+            return None
+        result, state = regression_checker.incremental_check(key, self._states.get(key))
+        with self._cond:
+            self._states[key] = state
+            self._results[key] = {"stat": stat, "result": result, "checked_at": time.time()}
+        return result
+
+    def _forget(self, path: str):
+        prefix = path + os.sep
+        with self._cond:
+            for cache in (self._results, self._states, self._due):
+                for key in [k for k in cache if k == path or k.startswith(prefix)]:
+                    del cache[key]
+
+    # ------------------------------------------------------------ queue
+
+    def queue(self, file_path: str):
+        """Schedule a check once the file has been quiet for the debounce window"""
+        with self._cond:
+            self._due[_normalize(file_path)] = time.monotonic() + self.debounce
+            self._cond.notify()
+
+    def _check_loop(self):
+        while True:
+            with self._cond:
+                while not self._due:
+                    self._cond.wait()
+                now = time.monotonic()
+                ready = [key for key, due in self._due.items() if due <= now]
+                if not ready:
+                    self._cond.wait(min(self._due.values()) - now)
+                    continue
+                for key in ready:
+                    del self._due[key]
+            # Skip what was already checked at this version, e.g. by check_now()
+            ready = [key for key in ready if self.latest(key) is None]
+            regression_checker.lint_batch(ready)
+            for key in ready:
+                try:
+                    result = self._check(key)
+                    if result is not None:
+                        logger.info(f"Auto-check {key}: {result.score}/100")
+                except Exception as e:
+                    logger.error(f"Auto-check of {key} failed: {e}")
+
+    # ------------------------------------------------------------ sources
+
+    def _watch_loop(self, inotify: _Inotify):
+        while True:
+            for directory, name, mask in inotify.read(timeout=1.0):
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped; re-check everything under the roots
+                    logger.warning("inotify queue overflowed, rescanning")
+                    for root in self._roots():
+                        inotify.unwatch_tree(root)
+                        for path in inotify.watch_tree(root):
+                            self.queue(path)
+                    continue
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+
+                if mask & IN_ISDIR or mask & IN_DELETE_SELF:
+                    tree_index.invalidate(directory)
+                    if mask & (IN_CREATE | IN_MOVED_TO) and _is_watched_dir(name):
+                        # e.g. a new sandbox task, or a plugin swapped in by integration
+                        for file_path in inotify.watch_tree(path):
+                            self.queue(file_path)
+                    elif mask & (IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF):
+                        inotify.unwatch_tree(path)
+                        self._forget(_normalize(path))
+                    continue
+
+                if not _is_watched_file(name):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_FROM | IN_DELETE):
+                    tree_index.invalidate(directory)
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self.queue(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget(_normalize(path))
+
+    def _scan(self) -> Dict[str, tuple]:
+        files = {}
+        for root in self._roots():
+            for directory, dirs, names in os.walk(root):
+                dirs[:] = [d for d in dirs if _is_watched_dir(d)]
+                for name in names:
+                    if _is_watched_file(name):
+                        path = os.path.join(directory, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _poll_loop(self):
+        interval = self.config["poll_interval"]
+        known = self._scan()
+        for path in known:
+            self.queue(path)
+        while True:
+            time.sleep(interval)
+            current = self._scan()
+            for path, stat in current.items():
+                if known.get(path) != stat:
+                    self.queue(path)
+            for path in known.keys() - current.keys():
+                self._forget(_normalize(path))
+            known = current
+
+    def _roots(self) -> List[str]:
+        return [os.path.normpath(path) for path in self.config["paths"] if os.path.isdir(path)]
+
+    def start(self):
+        """Start watching in daemon threads; existing files get an initial check"""
+        if self._threads or not self.config["enabled"]:
+            return
+
+        try:
+            inotify = _Inotify()
+            for root in self._roots():
+                for path in inotify.watch_tree(root):
+                    self.queue(path)
+            source = threading.Thread(target=self._watch_loop, args=(inotify,),
+                                      name="jarvis-watcher", daemon=True)
+            self.backend = "inotify"
+        except (OSError, AttributeError) as e:  # Not Linux, or inotify limits reached
+            logger.info(f"inotify unavailable ({e}), polling every {self.config['poll_interval']}s")
+            source = threading.Thread(target=self._poll_loop, name="jarvis-watcher", daemon=True)
+            self.backend = "polling"
+
+        self._threads = [
+            source,
+            threading.Thread(target=self._check_loop, name="jarvis-autocheck", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+
+# Global instance
+file_watcher = FileWatcher(settings.get("watcher"))
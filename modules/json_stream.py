@@ -0,0 +1,268 @@
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Parser states
+_SEEK_ROOT = "seek_root"
+_ROOT_KEY = "root_key"
+_ROOT_COLON = "root_colon"
+_ROOT_VALUE = "root_value"
+_ROOT_NEXT = "root_next"
+_FILES_KEY = "files_key"
+_FILES_COLON = "files_colon"
+_FILES_VALUE = "files_value"
+_FILES_NEXT = "files_next"
+_DONE = "done"
+
+_WHITESPACE = " \t\r\n"
+
+
+class StreamingFilesExtractor:
+    """
+    Incrementally extract {"files": {path: code}} from an LLM response.
+
+    Chunks are fed as they arrive from the model. Every file is emitted
+    (and passed to on_file) as soon as its string value is complete, so
+    callers can write and check it while the rest is still generating.
+    Markdown fences, chatter before the JSON and trailing text are ignored.
+    """
+
+    def __init__(self, on_file: Optional[Callable[[str, str], None]] = None):
+        self.on_file = on_file
+        self.files: Dict[str, str] = {}
+        self.errors: List[str] = []
+        self._buffer = ""
+        self._pos = 0
+        self._state = _SEEK_ROOT
+        self._key: Optional[str] = None
+        self._path: Optional[str] = None
+        self._saw_files = False
+        self._root_start = 0
+        # Where the scan of a still-streaming string stopped, to avoid rescanning it
+        self._scan_start = -1
+        self._scan_resume = 0
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consume a chunk and return the files completed by it"""
+        if self._state == _DONE or not chunk:
+            return []
+
+        self._buffer += chunk
+        completed = []
+        while True:
+            try:
+                while self._step(completed):
+                    pass
+                break
+            except ValueError as e:
+                if self._saw_files:
+                    self.errors.append(str(e))
+                    self._state = _DONE
+                    break
+                # A stray "{" in chatter before the JSON; retry from the next one
+                self._pos = self._root_start + 1
+                self._state = _SEEK_ROOT
+
+        # Drop consumed input so long responses don't grow the buffer
+        keep_from = self._pos if self._saw_files or self._state == _SEEK_ROOT else self._root_start
+        if keep_from > 4096:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            self._root_start = max(0, self._root_start - keep_from)
+            self._scan_start -= keep_from
+            self._scan_resume -= keep_from
+        return completed
+
+    def close(self) -> Dict[str, Dict[str, str]]:
+        """Finish the stream and return the parsed result"""
+        if not self._saw_files:
+            self.errors.append("Response has no \"files\" object")
+        elif self._state != _DONE:
+            pending = f" (truncated inside {self._path})" if self._path else ""
+            self.errors.append(f"Response ended before the files object was closed{pending}")
+
+        result = {"files": dict(self.files)}
+        if self.errors and not self.files:
+            result["error"] = "; ".join(self.errors)
+        return result
+
+    def _step(self, completed: List[Tuple[str, str]]) -> bool:
+        """Advance the state machine; return False when more input is needed"""
+        state = self._state
+
+        if state == _SEEK_ROOT:
+            idx = self._buffer.find("{", self._pos)
+            if idx == -1:
+                self._pos = len(self._buffer)
+                return False
+            self._root_start = idx
+            self._pos = idx + 1
+            self._state = _ROOT_KEY
+            return True
+
+        if state == _DONE:
+            return False
+
+        char = self._next_significant()
+        if char is None:
+            return False
+
+        if state == _ROOT_KEY:
+            if char == "}":
+                self._state = _DONE
+                return False
+            key = self._read_string()
+            if key is None:
+                return False
+            self._key = key
+            self._state = _ROOT_COLON
+
+        elif state in (_ROOT_COLON, _FILES_COLON):
+            self._expect(":")
+            self._state = _ROOT_VALUE if state == _ROOT_COLON else _FILES_VALUE
+
+        elif state == _ROOT_VALUE:
+            if self._key == "files":
+                self._expect("{")
+                self._saw_files = True
+                self._state = _FILES_KEY
+            else:
+                if not self._skip_value():
+                    return False
+                self._state = _ROOT_NEXT
+
+        elif state == _ROOT_NEXT:
+            self._pos += 1
+            if char == ",":
+                self._state = _ROOT_KEY
+            elif char == "}":
+                self._state = _DONE
+            else:
+                raise ValueError(f"Unexpected {char!r} after top-level value")
+
+        elif state == _FILES_KEY:
+            if char == "}":
+                self._pos += 1
+                self._state = _ROOT_NEXT
+                return True
+            path = self._read_string()
+            if path is None:
+                return False
+            self._path = path
+            self._state = _FILES_COLON
+
+        elif state == _FILES_VALUE:
+            if char != '"':
+                raise ValueError(f"Content of {self._path} is not a string")
+            content = self._read_string()
+            if content is None:
+                return False
+            self.files[self._path] = content
+            completed.append((self._path, content))
+            if self.on_file:
+                self.on_file(self._path, content)
+            self._path = None
+            self._state = _FILES_NEXT
+
+        elif state == _FILES_NEXT:
+            self._pos += 1
+            if char == ",":
+                self._state = _FILES_KEY
+            elif char == "}":
+                self._state = _ROOT_NEXT
+            else:
+                raise ValueError(f"Unexpected {char!r} between files")
+
+        return True
+
+    def _next_significant(self) -> Optional[str]:
+        """Skip whitespace and return the next character without consuming it"""
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        if self._pos >= len(self._buffer):
+            return None
+        return self._buffer[self._pos]
+
+    def _expect(self, char: str):
+        if self._buffer[self._pos] != char:
+            raise ValueError(f"Expected {char!r}, got {self._buffer[self._pos]!r}")
+        self._pos += 1
+
+    def _string_end(self, start: int) -> int:
+        """Index of the closing quote of the string opening at start, or -1"""
+        i = self._scan_resume if self._scan_start == start else start + 1
+        buffer = self._buffer
+        while True:
+            quote = buffer.find('"', i)
+            if quote == -1:
+                break
+            # The quote closes the string unless an odd run of backslashes escapes it
+            j = quote - 1
+            while j > start and buffer[j] == "\\":
+                j -= 1
+            if (quote - 1 - j) % 2 == 0:
+                return quote
+            i = quote + 1
+        self._scan_start = start
+        self._scan_resume = len(buffer)
+        return -1
+
+    def _read_string(self) -> Optional[str]:
+        """Decode a complete JSON string at the cursor, or None if it is still streaming"""
+        if self._buffer[self._pos] != '"':
+            raise ValueError(f"Expected string, got {self._buffer[self._pos]!r}")
+        end = self._string_end(self._pos)
+        if end == -1:
+            return None
+        raw = self._buffer[self._pos:end + 1]
+        self._pos = end + 1
+        # strict=False tolerates the raw newlines/tabs models leave in code strings
+        return json.loads(raw, strict=False)
+
+    def _skip_value(self) -> bool:
+        """Skip an arbitrary JSON value; False if it is not complete yet"""
+        buffer = self._buffer
+        if buffer[self._pos] == '"':
+            end = self._string_end(self._pos)
+            if end == -1:
+                return False
+            self._pos = end + 1
+            return True
+
+        depth = 0
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                end = self._string_end(i)
+                if end == -1:
+                    return False
+                i = end + 1
+                continue
+            if char in "{[":
+                depth += 1
+            elif char in "}]":
+                if depth == 0:
+                    break
+                depth -= 1
+                if depth == 0:
+                    i += 1
+                    break
+            elif char == "," and depth == 0:
+                break
+            i += 1
+        else:
+            return False
+
+        self._pos = i
+        return True
+
+
+def extract_files(response: str, on_file: Optional[Callable[[str, str], None]] = None) -> Dict[str, Dict[str, str]]:
+    """Parse a complete response with the streaming extractor"""
+    extractor = StreamingFilesExtractor(on_file)
+    extractor.feed(response)
+    return extractor.close()
@@ -0,0 +1,32 @@
+from typing import List
+
+# Telegram rejects messages above 4096 characters; leave room for the page footer
+TELEGRAM_LIMIT = 4000
+
+
+def paginate_text(text: str, limit: int = TELEGRAM_LIMIT) -> List[str]:
+    """Split text into Telegram-sized pages on line boundaries"""
+    if len(text) <= limit:
+        return [text]
+
+    pages = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        # Hard-wrap single lines that are longer than a page
+        while len(line) > limit:
+            if current:
+                pages.append(current)
+                current = ""
+            pages.append(line[:limit])
+            line = line[limit:]
+
+        if len(current) + len(line) > limit:
+            pages.append(current)
+            current = ""
+        current += line
+
+    if current:
+        pages.append(current)
+
+    total = len(pages)
+    return [f"{page.rstrip()}\n\n📄 Page {i}/{total}" for i, page in enumerate(pages, 1)]
@@ -0,0 +1,358 @@
+import os
+import ast
+from typing import Any, Dict, List, Optional, Set
+
+# Calls that block the event loop, with what to use instead
+BLOCKING_CALLS = {
+    "time.sleep": "use await asyncio.sleep()",
+    "open": "read/write files via asyncio.to_thread()",
+    "input": "never read stdin in a handler",
+    "os.system": "use asyncio.create_subprocess_shell()",
+    "subprocess.run": "use asyncio.create_subprocess_exec()",
+    "subprocess.call": "use asyncio.create_subprocess_exec()",
+    "subprocess.check_call": "use asyncio.create_subprocess_exec()",
+    "subprocess.check_output": "use asyncio.create_subprocess_exec()",
+    "urllib.request.urlopen": "use an async HTTP client (aiohttp)",
+    "socket.create_connection": "use asyncio.open_connection()",
+}
+# Every call into these modules blocks
+BLOCKING_MODULES = {
+    "requests": "use an async HTTP client (aiohttp)",
+}
+
+# Calls that take a coroutine and take care of awaiting it
+COROUTINE_CONSUMERS = {"create_task", "ensure_future", "gather", "wait_for", "shield", "run_coroutine_threadsafe"}
+# Client/message method names that are coroutines in Pyrogram; other calls may be synchronous
+COROUTINE_METHOD_PREFIXES = (
+    "reply", "send_", "edit_", "delete", "forward", "copy", "answer", "get_", "search_",
+    "download", "pin", "unpin", "ban_", "unban_", "restrict_", "promote_", "join_", "leave_",
+    "read_", "set_", "export_", "react", "vote", "retract_vote", "click", "invoke",
+    "start", "stop", "restart", "archive", "unarchive",
+)
+# Methods matching those prefixes that are not coroutines
+SYNC_CLIENT_METHODS = {
+    "add_handler", "remove_handler", "run", "stop_propagation", "continue_propagation",
+    "stop_transmission", "set_parse_mode",
+}
+
+
+def import_aliases(tree: ast.Module) -> Dict[str, str]:
+    """Local name -> dotted name it was imported as, for the whole module"""
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return aliases
+
+
+def dotted_name(node: ast.AST, aliases: Dict[str, str]) -> Optional[str]:
+    """Resolve a call target like rq.get or sleep to requests.get / time.sleep"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(aliases.get(node.id, node.id))
+    return ".".join(reversed(parts))
+
+
+def blocking_hint(name: Optional[str]) -> Optional[str]:
+    """What to do instead if calling name blocks the event loop, else None"""
+    if name is None:
+        return None
+    if name in BLOCKING_CALLS:
+        return BLOCKING_CALLS[name]
+    return BLOCKING_MODULES.get(name.split(".", 1)[0]) if "." in name else None
+
+
+def handler_decorator(node: ast.AST) -> Optional[str]:
+    """on_message, on_callback_query, ... if the decorator registers a handler"""
+    target = node.func if isinstance(node, ast.Call) else node
+    if isinstance(target, ast.Attribute) and target.attr.startswith("on_"):
+        return target.attr
+    return None
+
+
+class PyrogramVisitor(ast.NodeVisitor):
+    """
+    Pyrogram plugin conventions, checked in one pass over the module AST.
+
+    - a top-level register_handlers taking (bot) or (client, bot)
+    - every function registered with an on_* decorator is async
+    - no blocking calls directly inside async handlers
+    - client/message method calls inside handlers are awaited
+    """
+
+    def __init__(self, tree: ast.Module):
+        self.tree = tree
+        self.aliases = import_aliases(tree)
+        self.errors: List[str] = []
+        self.suggestions: List[str] = []
+        self._handler: Optional[ast.AST] = None
+        self._clients: Set[str] = set()  # Names bound to the client or to handler arguments
+        self._consumed: Set[int] = set()  # Calls whose coroutine is awaited or handed off
+        self._unguarded: List[str] = []
+
+    def run(self) -> "PyrogramVisitor":
+        self._check_register_handlers()
+        self.visit(self.tree)
+        if self._unguarded:
+            self.suggestions.append(f"Consider adding error handling in handler `{self._unguarded[0]}`")
+        return self
+
+    def _check_register_handlers(self):
+        register = next((node for node in self.tree.body
+                         if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                         and node.name == "register_handlers"), None)
+        if register is None:
+            self.errors.append("Missing register_handlers function")
+            return
+        if isinstance(register, ast.AsyncFunctionDef):
+            self.errors.append(f"register_handlers must be a regular function, not async (line {register.lineno})")
+
+        # plugin_loader passes (client, bot) if the signature has two or more parameters, else (bot)
+        args = register.args
+        positional = len(args.posonlyargs) + len(args.args)
+        parameters = positional + len(args.kwonlyargs) + bool(args.vararg) + bool(args.kwarg)
+        passed = 2 if parameters >= 2 else 1
+        required = positional - len(args.defaults)
+        kwonly_required = any(default is None for default in args.kw_defaults)
+        if required > passed or (passed > positional and not args.vararg) or kwonly_required:
+            self.errors.append(f"register_handlers must take (bot) or (client, bot) "
+                               f"(line {register.lineno})")
+
+    def _visit_function(self, node):
+        registrations = [handler_decorator(d) for d in node.decorator_list if handler_decorator(d)]
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        if node.name == "register_handlers" and node in self.tree.body:
+            self._clients.update(arg.arg for arg in node.args.posonlyargs + node.args.args)
+
+        if registrations and not isinstance(node, ast.AsyncFunctionDef):
+            self.errors.append(f"Handler `{node.name}` must be async (line {node.lineno})")
+
+        outer_handler, outer_clients = self._handler, set(self._clients)
+        if registrations and isinstance(node, ast.AsyncFunctionDef):
+            self._handler = node
+            self._clients.update(arg.arg for arg in node.args.posonlyargs + node.args.args)
+            if not any(isinstance(child, ast.Try) for child in ast.walk(node)):
+                self._unguarded.append(node.name)
+        else:
+            # Code in a nested function runs whenever that is called, not in the handler
+            self._handler = None
+
+        for child in node.body:
+            self.visit(child)
+        self._handler, self._clients = outer_handler, outer_clients
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_Lambda(self, node):
+        outer, self._handler = self._handler, None
+        self.generic_visit(node)
+        self._handler = outer
+
+    def visit_Await(self, node):
+        if isinstance(node.value, ast.Call):
+            self._consumed.add(id(node.value))
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        func = node.func
+        name = dotted_name(func, self.aliases)
+        if name and name.rsplit(".", 1)[-1] in COROUTINE_CONSUMERS:
+            self._consumed.update(id(arg) for arg in node.args if isinstance(arg, ast.Call))
+
+        if self._handler is not None:
+            hint = blocking_hint(name)
+            if hint:
+                self.errors.append(f"Blocking call {name}() in async handler `{self._handler.name}` "
+                                   f"(line {node.lineno}); {hint}")
+            elif (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+                  and func.value.id in self._clients and id(node) not in self._consumed
+                  and func.attr.startswith(COROUTINE_METHOD_PREFIXES) and func.attr not in SYNC_CLIENT_METHODS):
+                self.errors.append(f"{func.value.id}.{func.attr}() is not awaited in handler "
+                                   f"`{self._handler.name}` (line {node.lineno})")
+        self.generic_visit(node)
+
+
+def pyrogram_findings(tree: ast.Module) -> Dict[str, List[str]]:
+    """Errors and suggestions for a parsed plugin module"""
+    visitor = PyrogramVisitor(tree).run()
+    return {"errors": visitor.errors, "warnings": [], "suggestions": visitor.suggestions}
+
+
+def local_aliases(tree: ast.Module) -> Dict[str, str]:
+    """import_aliases plus relative imports, read as imports of sibling modules"""
+    aliases = import_aliases(tree)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level:
+            for alias in node.names:
+                target = f"{node.module}.{alias.name}" if node.module else alias.name
+                aliases[alias.asname or alias.name] = target
+    return aliases
+
+
+class _FunctionCollector(ast.NodeVisitor):
+    """Every function of one module, with its direct blocking calls and outgoing calls"""
+
+    def __init__(self, path: str, aliases: Dict[str, str]):
+        self.path = path
+        self.aliases = aliases
+        self.functions: Dict[str, Dict[str, Any]] = {}
+        self._scope: List[str] = []  # Enclosing class/function names
+        self._function: Optional[Dict[str, Any]] = None
+
+    def _visit_function(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        qualname = ".".join(self._scope + [node.name])
+        info = {
+            "path": self.path,
+            "qualname": qualname,
+            "scope": list(self._scope),
+            "line": node.lineno,
+            "handler": isinstance(node, ast.AsyncFunctionDef) and any(
+                handler_decorator(d) for d in node.decorator_list),
+            "blocking": [],  # (call, line, hint)
+            "calls": [],     # (dotted target, line)
+        }
+        self.functions[qualname] = info
+
+        outer = self._function
+        self._function = info
+        self._scope.append(node.name)
+        for child in node.body:
+            self.visit(child)
+        self._scope.pop()
+        self._function = outer
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_ClassDef(self, node):
+        self._scope.append(node.name)
+        self.generic_visit(node)
+        self._scope.pop()
+
+    def visit_Lambda(self, node):
+        # A lambda body runs when it is called, e.g. in an executor
+        outer, self._function = self._function, None
+        self.generic_visit(node)
+        self._function = outer
+
+    def visit_Call(self, node):
+        if self._function is not None:
+            name = dotted_name(node.func, self.aliases)
+            hint = blocking_hint(name)
+            if hint:
+                self._function["blocking"].append((name, node.lineno, hint))
+            elif name:
+                self._function["calls"].append((name, node.lineno))
+        self.generic_visit(node)
+
+
+class CallGraph:
+    """
+    Calls between the functions of one plugin's modules.
+
+    Names are resolved the way Python would for the common cases: nested
+    functions of the enclosing scopes, then the module's own functions,
+    then functions imported from sibling modules; self.method() resolves
+    within the class. Functions only passed by reference (to
+    asyncio.to_thread, run_in_executor, ...) are not calls, so handing
+    blocking work to a thread is not reported.
+    """
+
+    def __init__(self, sources: Dict[str, ast.Module], root: str = "."):
+        self.functions: Dict[tuple, Dict[str, Any]] = {}
+        self._modules: Dict[str, str] = {}
+        self._aliases: Dict[str, Dict[str, str]] = {}
+        for path, tree in sources.items():
+            module = os.path.splitext(os.path.relpath(path, root))[0].replace(os.sep, ".")
+            self._modules[module] = path
+            self._modules.setdefault(module.rsplit(".", 1)[-1], path)
+            collector = _FunctionCollector(path, local_aliases(tree))
+            collector.visit(tree)
+            for qualname, info in collector.functions.items():
+                self.functions[(path, qualname)] = info
+
+    def resolve(self, caller: Dict[str, Any], target: str) -> Optional[tuple]:
+        """Function key a dotted call target refers to, if it is defined in the plugin"""
+        path, scope = caller["path"], caller["scope"] + [caller["qualname"].rsplit(".", 1)[-1]]
+        head, _, rest = target.partition(".")
+
+        if head == "self" and rest and len(scope) >= 2:
+            # Methods of the class the caller is defined in
+            key = (path, ".".join(scope[:-1] + [rest]))
+            return key if key in self.functions else None
+
+        if not rest:
+            for depth in range(len(scope), -1, -1):
+                key = (path, ".".join(scope[:depth] + [target]))
+                if key in self.functions:
+                    return key
+
+        # module.function, or a function imported from a sibling module
+        parts = target.split(".")
+        for split in range(len(parts) - 1, 0, -1):
+            module_path = self._modules.get(".".join(parts[:split]))
+            if module_path is not None:
+                key = (module_path, ".".join(parts[split:]))
+                return key if key in self.functions else None
+        return None
+
+    def blocking_paths(self) -> List[Dict[str, Any]]:
+        """Blocking calls reachable from each async handler, with the call chain"""
+        findings = []
+        for key, handler in self.functions.items():
+            if not handler["handler"]:
+                continue
+            parents = {key: None}
+            queue = [key]
+            while queue:
+                current = queue.pop(0)
+                info = self.functions[current]
+                if info["blocking"]:
+                    chain, step = [], current
+                    while step is not None:
+                        chain.append(self.functions[step]["qualname"].rsplit(".", 1)[-1])
+                        step = parents[step]
+                    for call, line, hint in info["blocking"]:
+                        findings.append({
+                            "path": info["path"], "line": line, "call": call, "hint": hint,
+                            "handler": handler["qualname"].rsplit(".", 1)[-1],
+                            "handler_path": handler["path"], "handler_line": handler["line"],
+                            "chain": list(reversed(chain)),
+                        })
+                for target, _ in info["calls"]:
+                    callee = self.resolve(info, target)
+                    if callee is not None and callee not in parents:
+                        parents[callee] = current
+                        queue.append(callee)
+        return findings
+
+
+def format_blocking(finding: Dict[str, Any], path: Optional[str] = None) -> str:
+    """path:line: message for a blocking_paths() finding"""
+    return (f"{path or finding['path']}:{finding['line']}: Blocking call {finding['call']}() reachable "
+            f"from async handler `{finding['handler']}` via {' → '.join(finding['chain'])}; {finding['hint']}")
+
+
+def blocking_findings(file_paths: List[str], root: str = ".") -> List[Dict[str, Any]]:
+    """Parse a plugin's files and find blocking calls reachable from its async handlers"""
+    sources = {}
+    for path in file_paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                sources[path] = ast.parse(f.read())
+        except (OSError, SyntaxError, ValueError):
+            continue  # Reported by the syntax check
+    return CallGraph(sources, root).blocking_paths()
@@ -1,39 +1,92 @@
 import os
+import inspect
 import importlib.util
 import json
 
-def load_plugins(bot):
-    folder = "plugins"
-    disabled_path = "config/disabled_plugins.json"
+PLUGINS_DIR = "plugins"
+DISABLED_PATH = "config/disabled_plugins.json"
 
-    # Load disabled plugins
-    disabled = []
-    if os.path.exists(disabled_path):
-        with open(disabled_path, "r") as f:
-            disabled = json.load(f)
+# Handlers each loaded plugin added, so it can be replaced without a restart
+_loaded = {}
 
-    for plugin_name in os.listdir(folder):
-        plugin_dir = os.path.join(folder, plugin_name)
+def _disabled_plugins():
+    if os.path.exists(DISABLED_PATH):
+        with open(DISABLED_PATH, "r") as f:
+            return json.load(f)
+    return []
 
-        # Skip non-directories and disabled plugins
-        if not os.path.isdir(plugin_dir) or plugin_name in disabled:
-            continue
-
-        handler_path = os.path.join(plugin_dir, "handler.py")
-        if not os.path.exists(handler_path):
-            print(f"[WARN] Plugin '{plugin_name}' missing handler.py")
-            continue
+def _register(mod, bot):
+    """Call register_handlers with (bot) or (client, bot), whichever it takes"""
+    params = inspect.signature(mod.register_handlers).parameters
+    if len(params) >= 2:
+        mod.register_handlers(bot, bot)
+    else:
+        mod.register_handlers(bot)
 
+def _remove_handlers(bot, plugin_name, handlers):
+    for handler, group in handlers:
         try:
-            spec = importlib.util.spec_from_file_location(plugin_name, handler_path)
-            mod = importlib.util.module_from_spec(spec)
-            mod.bot = bot  # Optional: provide shared bot instance
-            spec.loader.exec_module(mod)
+            bot.remove_handler(handler, group)
+        except Exception as e:
+            print(f"[WARN] Failed to remove handler of '{plugin_name}': {e}")
+
+def unload_plugin(bot, plugin_name):
+    _remove_handlers(bot, plugin_name, _loaded.pop(plugin_name, []))
+
+def load_plugin(bot, plugin_name):
+    """Load (or reload) one plugin; returns True if its handlers are active"""
+    plugin_dir = os.path.join(PLUGINS_DIR, plugin_name)
+    if not os.path.isdir(plugin_dir) or plugin_name in _disabled_plugins():
+        return False
+
+    handler_path = os.path.join(plugin_dir, "handler.py")
+    if not os.path.exists(handler_path):
+        print(f"[WARN] Plugin '{plugin_name}' missing handler.py")
+        return False
+
+    try:
+        spec = importlib.util.spec_from_file_location(plugin_name, handler_path)
+        mod = importlib.util.module_from_spec(spec)
+        mod.bot = bot  # Optional: provide shared bot instance
+        spec.loader.exec_module(mod)
 
+        # Record the handlers the plugin adds while registering
+        added = []
+        add_handler = bot.add_handler
+
+        def recording_add_handler(handler, group=0):
+            result = add_handler(handler, group)
+            added.append((handler, group))
+            return result
+
+        # Register the new handlers first, so a failure leaves the old ones active
+        bot.add_handler = recording_add_handler
+        try:
             if hasattr(mod, "register_handlers"):
-                mod.register_handlers(bot)
+                _register(mod, bot)
+        except Exception:
+            # Drop whatever the failed registration added before it raised
+            _remove_handlers(bot, plugin_name, added)
+            raise
+        finally:
+            del bot.add_handler
 
-            print(f"[PLUGIN LOADED] {plugin_name}")
+        unload_plugin(bot, plugin_name)
+        _loaded[plugin_name] = added
 
-        except Exception as e:
-            print(f"[ERROR] Failed to load plugin '{plugin_name}': {e}")
+        print(f"[PLUGIN LOADED] {plugin_name}")
+        return True
+
+    except Exception as e:
+        print(f"[ERROR] Failed to load plugin '{plugin_name}': {e}")
+        return False
+
+def load_plugins(bot):
+    if not os.path.isdir(PLUGINS_DIR):
+        return
+
+    for plugin_name in os.listdir(PLUGINS_DIR):
+        # Skip staging/backup directories left by an interrupted integration
+        if plugin_name.startswith("."):
+            continue
+        load_plugin(bot, plugin_name)
@@ -3,24 +3,80 @@ import ast
 import importlib.util
 import sys
 import os
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple, Callable
+import json
 import logging
+import hashlib
+from modules.check_cache import fingerprint, is_reusable, remap_messages
+from memory.models import Issue
+from modules.plugin_analysis import pyrogram_findings, blocking_findings, format_blocking
+
+try:
+    import black
+except ImportError:  # Fall back to the black CLI if it is on PATH
+    black = None
+
+try:
+    import isort
+except ImportError:  # Fall back to the isort CLI if it is on PATH
+    isort = None
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Where a ruff rule lands in a CheckResult: first matching code prefix wins,
+# anything unlisted is a style suggestion. Syntax errors carry no code.
+RUFF_SEVERITY = (
+    ("E9", "errors"),     # syntax / IO errors
+    ("invalid-syntax", "errors"),
+    ("F63", "errors"),    # invalid comparisons and asserts
+    ("F7", "errors"),     # misplaced return/yield/await, break outside loop
+    ("F82", "errors"),    # undefined names
+    ("PLE", "errors"),
+    ("F", "warnings"),    # unused imports/variables, redefinitions
+    ("E7", "warnings"),   # bare except, comparisons to None/True
+    ("B", "warnings"),
+    ("PLW", "warnings"),
+)
+
+
+def ruff_severity(code: Optional[str]) -> str:
+    if not code:
+        return "errors"
+    for prefix, kind in RUFF_SEVERITY:
+        if code.startswith(prefix):
+            return kind
+    return "suggestions"
+
 class CheckResult:
     """Result of code quality check"""
-    passed: bool
-    errors: List[str]
-    warnings: List[str]
-    suggestions: List[str]
-    score: int  # 0-100 quality score
+    __slots__ = ("passed", "errors", "warnings", "suggestions", "score", "reused")
+    
+    def __init__(self, passed: bool, errors: List[str], warnings: List[str], suggestions: List[str],
+                 score: int, reused: Optional[List[str]] = None):
+        self.passed = passed
+        self.errors = errors
+        self.warnings = warnings
+        self.suggestions = suggestions
+        self.score = score  # 0-100 quality score
+        self.reused = reused if reused is not None else []  # checks answered from cache
+    
+    def issues(self, file_path: str) -> List[Issue]:
+        """Errors and warnings as compact Issues (see memory/models.py)"""
+        return [Issue.parse(text, file_path) for text in self.errors + self.warnings]
+    
+    def __eq__(self, other):
+        return isinstance(other, CheckResult) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+    
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"CheckResult({fields})"
 
 class RegressionChecker:
     def __init__(self):
         self.tools_available = self._check_available_tools()
+        # Ruff findings linted ahead for a batch: abspath -> (content digest, findings)
+        self._lint_batch: Dict[str, Tuple[Optional[str], Dict[str, List[str]]]] = {}
         
     def _check_available_tools(self) -> Dict[str, bool]:
         """Check which linting tools are available"""
@@ -30,6 +86,7 @@ class RegressionChecker:
             'black': self._tool_available('black'),
             'isort': self._tool_available('isort'),
             'bandit': self._tool_available('bandit'),
+            'ruff': self._tool_available('ruff'),
         }
         return tools
     
@@ -42,8 +99,25 @@ class RegressionChecker:
         except (subprocess.CalledProcessError, FileNotFoundError):
             return False
     
-    def comprehensive_check(self, file_path: str) -> CheckResult:
-        """Run comprehensive code quality checks"""
+    def comprehensive_check(self, file_path: str, deep: bool = False) -> CheckResult:
+        """Run comprehensive code quality checks (deep adds pylint)"""
+        result, _ = self.incremental_check(file_path, deep=deep)
+        return result
+    
+    def incremental_check(self, file_path: str, previous: Optional[Dict[str, Any]] = None,
+                          deep: bool = False) -> Tuple[CheckResult, Dict[str, Any]]:
+        """
+        Run the checks, re-using results from a previously checked version
+        
+        previous is the state returned for an earlier version of the same
+        file (see modules/check_cache.py). A check whose inputs did not
+        change keeps its cached findings; every other check re-runs.
+        Linting uses ruff (pyflakes when ruff is missing); deep also runs
+        pylint, which takes seconds per file.
+
+        Returns:
+            The full CheckResult and the state to cache for this version
+        """
         result = CheckResult(
             passed=True,
             errors=[],
@@ -52,58 +126,146 @@ class RegressionChecker:
             score=100
         )
         
-        # 1. Syntax validation
-        syntax_ok = self._check_syntax(file_path, result)
+        # 1. Syntax validation, always run: it also gives us the AST to diff
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            content = None
+            result.errors.append(f"File Error: {e}")
         
-        # 2. Static analysis
-        if syntax_ok:
-            self._run_static_analysis(file_path, result)
-            
-        # 3. Security scan
-        self._security_scan(file_path, result)
+        tree = self._check_syntax(content, result) if content is not None else None
         
-        # 4. Import validation
-        self._check_imports(file_path, result)
+        state = fingerprint(content or "", tree)
+        state["path"] = file_path
+        state["checks"] = {}
         
-        # 5. Pyrogram-specific checks
-        self._pyrogram_checks(file_path, result)
+        # 2-6. Static analysis, security scan, import validation, Pyrogram checks
+        for name, check, scope in self._checks(tree, deep=deep):
+            cached = previous.get("checks", {}).get(name) if previous else None
+            if cached is not None and is_reusable(scope, previous, state):
+                old_path = previous.get("path", file_path)
+                partial = {
+                    kind: remap_messages(messages, previous, state, old_path, file_path)
+                    for kind, messages in cached.items()
+                }
+                result.reused.append(name)
+            else:
+                part = CheckResult(passed=True, errors=[], warnings=[], suggestions=[], score=100)
+                check(file_path, part)
+                partial = {"errors": part.errors, "warnings": part.warnings, "suggestions": part.suggestions}
+            
+            state["checks"][name] = partial
+            result.errors.extend(partial["errors"])
+            result.warnings.extend(partial["warnings"])
+            result.suggestions.extend(partial["suggestions"])
         
-        # 6. Calculate final score
+        # 7. Calculate final score
         result.score = self._calculate_score(result)
         result.passed = result.score >= 70 and len(result.errors) == 0
         
-        return result
+        return result, state
+    
+    def _checks(self, tree: Optional[ast.Module],
+                deep: bool = False) -> List[Tuple[str, Callable[[str, CheckResult], None], str]]:
+        """Checks in report order, with the scope of input each depends on"""
+        checks = []
+        if tree is not None:
+            if self.tools_available['ruff']:
+                checks.append(('ruff', self._run_ruff, 'content'))
+            else:
+                checks.append(('pyflakes', self._run_pyflakes, 'ast'))
+            if deep:
+                checks.append(('static', self._run_static_analysis, 'content'))
+        checks += [
+            ('security', self._security_scan, 'ast'),
+            ('imports', lambda path, result: self._check_imports(path, result, tree), 'imports'),
+        ]
+        if tree is not None:
+            # Reuses the tree parsed for the syntax check
+            checks.append(('pyrogram', lambda path, result: self._pyrogram_checks(path, result, tree), 'ast'))
+            # Depends on the plugin's other modules too, so never answered from cache
+            checks.append(('event_loop', self._event_loop_checks, 'plugin'))
+        return checks
     
-    def _check_syntax(self, file_path: str, result: CheckResult) -> bool:
-        """Check Python syntax"""
+    def _check_syntax(self, content: str, result: CheckResult) -> Optional[ast.Module]:
+        """Check Python syntax; returns the parsed tree, or None on error"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            ast.parse(content)
-            
-            # Also run pyflakes if available
-            if self.tools_available['pyflakes']:
-                pyflakes_result = subprocess.run(
-                    ['pyflakes', file_path],
-                    capture_output=True, text=True
-                )
-                
-                if pyflakes_result.returncode != 0:
-                    errors = pyflakes_result.stdout + pyflakes_result.stderr
-                    result.errors.extend(errors.strip().split('\n'))
-                    
-            return True
-            
+            return ast.parse(content)
         except SyntaxError as e:
             result.errors.append(f"Syntax Error: {e}")
-            return False
+            return None
+    
+    def lint_batch(self, file_paths: List[str]):
+        """
+        Lint many files with a single ruff run ahead of checking them
+        
+        The findings are held until each file's ruff check asks for them,
+        and are only used if the file has not changed in between.
+        """
+        if not self.tools_available['ruff'] or not file_paths:
+            return
+        # Digests taken first, so a file changed while ruff runs is linted again later
+        digests = {os.path.abspath(path): self._digest(path) for path in file_paths}
+        findings = self._ruff(file_paths)
+        if findings is None:
+            return
+        for path, digest in digests.items():
+            self._lint_batch[path] = (digest, findings.get(path, {}))
+    
+    def _ruff(self, file_paths: List[str]) -> Optional[Dict[str, Dict[str, List[str]]]]:
+        """One ruff run; findings per absolute path, or None if ruff failed"""
+        try:
+            ruff_result = subprocess.run(
+                ['ruff', 'check', '--output-format', 'json', '--exit-zero', '--no-cache', *file_paths],
+                capture_output=True, text=True, timeout=60
+            )
+            diagnostics = json.loads(ruff_result.stdout or '[]')
         except Exception as e:
-            result.errors.append(f"File Error: {e}")
-            return False
+            logger.warning(f"Ruff check failed: {e}")
+            return None
+        
+        shown = {os.path.abspath(path): path for path in file_paths}
+        findings: Dict[str, Dict[str, List[str]]] = {}
+        for item in diagnostics:
+            path = os.path.abspath(item['filename'])
+            code = item.get('code')
+            location = item.get('location') or {}
+            text = (f"{shown.get(path, item['filename'])}:{location.get('row', 0)}:{location.get('column', 0)}: "
+                    f"{code or 'E999'} {item['message']}")
+            kinds = findings.setdefault(path, {'errors': [], 'warnings': [], 'suggestions': []})
+            kinds[ruff_severity(code)].append(text)
+        return findings
+    
+    def _run_ruff(self, file_path: str, result: CheckResult):
+        """Lint with ruff, using batch results when they match the file"""
+        path = os.path.abspath(file_path)
+        batched = self._lint_batch.pop(path, None)
+        if batched is not None and batched[0] == self._digest(file_path):
+            findings = batched[1]
+        else:
+            findings = self._ruff([file_path])
+            if findings is None:
+                return
+            findings = findings.get(path, {})
+        result.errors.extend(findings.get('errors', []))
+        result.warnings.extend(findings.get('warnings', []))
+        result.suggestions.extend(findings.get('suggestions', []))
+    
+    def _run_pyflakes(self, file_path: str, result: CheckResult):
+        """Run pyflakes if available"""
+        if self.tools_available['pyflakes']:
+            pyflakes_result = subprocess.run(
+                ['pyflakes', file_path],
+                capture_output=True, text=True
+            )
+            
+            if pyflakes_result.returncode != 0:
+                errors = pyflakes_result.stdout + pyflakes_result.stderr
+                result.errors.extend(errors.strip().split('\n'))
     
     def _run_static_analysis(self, file_path: str, result: CheckResult):
-        """Run static analysis tools"""
+        """Run pylint (deep checks only)"""
         
         # Pylint check
         if self.tools_available['pylint']:
@@ -147,13 +309,12 @@ class RegressionChecker:
             except Exception as e:
                 logger.warning(f"Security scan failed: {e}")
     
-    def _check_imports(self, file_path: str, result: CheckResult):
+    def _check_imports(self, file_path: str, result: CheckResult, tree: Optional[ast.Module] = None):
         """Validate imports and dependencies"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            tree = ast.parse(content)
+            if tree is None:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    tree = ast.parse(f.read())
             
             # Check for required Pyrogram imports
             imports = []
@@ -176,27 +337,62 @@ class RegressionChecker:
         except Exception as e:
             result.warnings.append(f"Import check failed: {e}")
     
-    def _pyrogram_checks(self, file_path: str, result: CheckResult):
-        """Pyrogram-specific validation"""
+    def _pyrogram_checks(self, file_path: str, result: CheckResult, tree: Optional[ast.Module] = None):
+        """Pyrogram-specific validation (see modules/plugin_analysis.py)"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Check for register_handlers function
-            if 'register_handlers' not in content:
-                result.errors.append("Missing register_handlers function")
+            if tree is None:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    tree = ast.parse(f.read())
             
-            # Check for proper async/await usage
-            if '@bot.on_message' in content and 'async def' not in content:
-                result.errors.append("Message handlers must be async")
-            
-            # Check for proper error handling
-            if 'try:' not in content and '@bot.on_message' in content:
-                result.suggestions.append("Consider adding error handling")
+            findings = pyrogram_findings(tree)
+            result.errors.extend(findings["errors"])
+            result.warnings.extend(findings["warnings"])
+            result.suggestions.extend(findings["suggestions"])
                 
         except Exception as e:
             result.warnings.append(f"Pyrogram check failed: {e}")
     
+    def _event_loop_checks(self, file_path: str, result: CheckResult):
+        """Blocking calls reachable from this file's async handlers through plugin functions"""
+        try:
+            root, files = self._plugin_files(file_path)
+            for finding in self.find_blocking_calls(files, root):
+                # Blocking calls made directly in the handler are reported by the Pyrogram checks
+                if len(finding["chain"]) > 1 and os.path.samefile(finding["handler_path"], file_path):
+                    result.errors.append(format_blocking(finding, os.path.relpath(finding["path"], root)))
+        except Exception as e:
+            result.warnings.append(f"Event loop check failed: {e}")
+    
+    def find_blocking_calls(self, file_paths: List[str], root: str = ".") -> List[Dict[str, Any]]:
+        """
+        Blocking calls reachable from the async handlers of one plugin
+        
+        Args:
+            file_paths: The plugin's Python files
+            root: The plugin directory, for resolving imports between its modules
+            
+        Returns:
+            One finding per blocking call and handler, with the call chain
+        """
+        return blocking_findings(file_paths, root)
+    
+    def _plugin_files(self, file_path: str) -> Tuple[str, List[str]]:
+        """
+        The plugin directory a file belongs to and its Python files
+        
+        Files under sandbox/<plugin> or plugins/<plugin> are analysed with
+        the rest of their plugin; any other file (e.g. a temp file) alone.
+        """
+        parts = os.path.relpath(file_path).split(os.sep)
+        if len(parts) < 3 or parts[0] not in ('sandbox', 'plugins'):
+            return os.path.dirname(file_path) or '.', [file_path]
+        root = os.path.join(parts[0], parts[1])
+        files = []
+        for directory, dirs, names in os.walk(root):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d != '__pycache__']
+            files.extend(os.path.join(directory, name) for name in sorted(names) if name.endswith('.py'))
+        return root, files
+    
     def _calculate_score(self, result: CheckResult) -> int:
         """Calculate quality score"""
         score = 100
@@ -209,25 +405,74 @@ class RegressionChecker:
         return max(0, score)
     
     def auto_fix(self, file_path: str) -> bool:
-        """Attempt to auto-fix common issues"""
-        try:
-            fixed = False
-            
-            # Auto-format with black
-            if self.tools_available['black']:
-                subprocess.run(['black', file_path], check=True)
-                fixed = True
-            
-            # Sort imports with isort
-            if self.tools_available['isort']:
-                subprocess.run(['isort', file_path], check=True)
-                fixed = True
-            
-            return fixed
+        """Attempt to auto-fix common issues; True if the file changed"""
+        return bool(self.auto_fix_files([file_path]))
+    
+    def auto_fix_files(self, file_paths: List[str]) -> List[str]:
+        """
+        Run ruff --fix, isort and black over a batch of files
+        
+        ruff has no Python API, so it runs once for the whole batch.
+        isort and black run in-process when importable (one read and one
+        write per file); otherwise each CLI runs once for the batch.
+        Files that do not parse are left to the tools that can handle them.
+        
+        Args:
+            file_paths: Files to fix
             
+        Returns:
+            The files whose content changed
+        """
+        file_paths = [path for path in file_paths if os.path.isfile(path)]
+        if not file_paths:
+            return []
+        before = {path: self._digest(path) for path in file_paths}
+        
+        if self.tools_available['ruff']:
+            self._run_batch(['ruff', 'check', '--fix', '--exit-zero', '--no-cache', '--quiet'], file_paths)
+        
+        if isort is not None or black is not None:
+            for path in file_paths:
+                self._format_in_process(path)
+        if isort is None and self.tools_available['isort']:
+            self._run_batch(['isort', '--profile', 'black', '--quiet'], file_paths)
+        if black is None and self.tools_available['black']:
+            self._run_batch(['black', '--quiet'], file_paths)
+        
+        return [path for path in file_paths if self._digest(path) != before[path]]
+    
+    def _digest(self, file_path: str) -> Optional[str]:
+        try:
+            with open(file_path, 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+    
+    def _run_batch(self, command: List[str], file_paths: List[str]):
+        """One invocation of a fixer CLI over all files"""
+        try:
+            subprocess.run(command + file_paths, capture_output=True, text=True, timeout=120)
         except Exception as e:
-            logger.error(f"Auto-fix failed: {e}")
-            return False
+            logger.error(f"Auto-fix with {command[0]} failed: {e}")
+    
+    def _format_in_process(self, file_path: str):
+        """isort then black on one file, without spawning either tool"""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                original = f.read()
+            content = original
+            if isort is not None:
+                content = isort.code(content, profile='black')
+            if black is not None:
+                try:
+                    content = black.format_file_contents(content, fast=False, mode=black.Mode())
+                except black.NothingChanged:
+                    pass
+            if content != original:
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+        except Exception as e:
+            logger.warning(f"Formatting {file_path} failed: {e}")
     
     def get_fix_suggestions(self, file_path: str) -> List[str]:
         """Get actionable fix suggestions"""
@@ -252,7 +497,7 @@ class RegressionChecker:
 # Legacy function for backward compatibility
 def lint_code(file_path: str) -> str:
     """Legacy function - use comprehensive_check instead"""
-    checker = EnhancedRegressionChecker()
+    checker = RegressionChecker()
     result = checker.comprehensive_check(file_path)
     
     output = []
@@ -269,4 +514,4 @@ def lint_code(file_path: str) -> str:
     return '\n'.join(output)
 
 # Global instance
-regression_checker = EnhancedRegressionChecker()
+regression_checker = RegressionChecker()
@@ -0,0 +1,86 @@
+import os
+import threading
+from typing import Dict, List, Any
+
+IGNORED = {"__pycache__"}
+
+
+class TreeIndex:
+    """
+    Cached directory listing of the project for /tree.
+
+    Each directory's entries are listed once and kept with the directory's
+    mtime. A refresh stats the directories about to be shown and re-lists
+    only those whose mtime changed (an entry was added, removed or
+    renamed), so repeated /tree calls cost one stat per directory instead
+    of a full walk. Hidden entries and __pycache__ are skipped.
+    """
+
+    def __init__(self, root: str = "."):
+        self.root = os.path.normpath(root)
+        self._dirs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()  # invalidate() is also called while refreshing
+
+    def _list(self, path: str, mtime_ns: int):
+        dirs, files = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or entry.name in IGNORED:
+                        continue
+                    (dirs if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+        except (PermissionError, FileNotFoundError):
+            pass
+        self._dirs[path] = {"mtime_ns": mtime_ns, "dirs": sorted(dirs), "files": sorted(files)}
+
+    def _refresh(self, path: str, depth: int):
+        """Bring path and depth levels of directories below it up to date"""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.invalidate(path)
+            return
+
+        node = self._dirs.get(path)
+        if node is None or node["mtime_ns"] != mtime_ns:
+            old_dirs = set(node["dirs"]) if node else set()
+            self._list(path, mtime_ns)
+            for removed in old_dirs - set(self._dirs[path]["dirs"]):
+                self.invalidate(os.path.join(path, removed))
+
+        if depth > 0:
+            for name in self._dirs[path]["dirs"]:
+                self._refresh(os.path.join(path, name), depth - 1)
+
+    def invalidate(self, path: str):
+        """Forget path and its subdirectories (e.g. after a watcher event)"""
+        prefix = path + os.sep
+        with self._lock:
+            for key in [k for k in self._dirs if k == path or k.startswith(prefix)]:
+                del self._dirs[key]
+
+    def render(self, path: str = ".", max_depth: int = 3) -> List[str]:
+        """Tree lines for path, max_depth levels of directories below it"""
+        path = os.path.normpath(os.path.join(self.root, path))
+        if not os.path.isdir(path):
+            raise FileNotFoundError(path)
+
+        with self._lock:
+            self._refresh(path, max_depth)
+            lines = [path if path != self.root else "."]
+            self._render(path, "", max_depth, lines)
+        return lines
+
+    def _render(self, path: str, prefix: str, depth: int, lines: List[str]):
+        node = self._dirs[path]
+        entries = [(name, True) for name in node["dirs"]] + [(name, False) for name in node["files"]]
+        entries.sort()
+        for i, (name, is_dir) in enumerate(entries):
+            is_last = i == len(entries) - 1
+            lines.append(f"{prefix}{'└── ' if is_last else '├── '}{name}{'/' if is_dir else ''}")
+            if is_dir and depth > 0:
+                self._render(os.path.join(path, name), prefix + ("    " if is_last else "│   "), depth - 1, lines)
+
+
+# Global instance
+tree_index = TreeIndex()